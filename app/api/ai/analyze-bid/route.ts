@@ -1,10 +1,17 @@
 import { type NextRequest, NextResponse } from "next/server";
 
+// How long the ML API may take before we use the rule-based analysis. The
+// API sheds requests it cannot answer in time with an immediate 429 / 503,
+// so the fallback starts right away under overload; the abort covers an
+// unreachable API.
+const ML_DEADLINE_MS = 800;
+
 export async function POST(request: NextRequest) {
   try {
     const { projectId, bidData, project } = await request.json();
 
-    // Prepare features for ML model
+    // Prepare features for ML model; every field the API's schema requires
+    // must be here (ml-api/test_contract.py checks)
     const features = {
       bid_total: parseFloat(bidData.cost.total) || 0,
       materials_cost: parseFloat(bidData.cost.materials) || 0,
@@ -33,6 +40,8 @@ export async function POST(request: NextRequest) {
           ? bidData.compliance.permits.length
           : 0, // Example: use length as a proxy
       profit_margin: parseFloat(bidData.profitability?.profitMargin) || 0,
+      roi: parseFloat(bidData.profitability?.roi) || 0,
+      contingency: parseFloat(bidData.profitability?.contingency) || 0,
       project_budget: project?.budget || 0,
       category: project?.category || "unknown",
     };
@@ -40,16 +49,20 @@ export async function POST(request: NextRequest) {
     // Try ML API
     let mlResult = null;
     try {
-      const mlResponse = await fetch("http://localhost:8000/predict", {
+      const mlResponse = await fetch("http://localhost:8000/predict?explain=true", {
         method: "POST",
-        headers: { "Content-Type": "application/json" },
+        headers: {
+          "Content-Type": "application/json",
+          "X-Deadline-Ms": String(ML_DEADLINE_MS),
+        },
         body: JSON.stringify({ features }),
+        signal: AbortSignal.timeout(ML_DEADLINE_MS + 200),
       });
       if (mlResponse.ok) {
         mlResult = await mlResponse.json();
       }
     } catch (mlError) {
-      // ML API failed, will use fallback
+      // ML API unreachable or too slow, will use fallback
     }
 
     if (mlResult && !mlResult.error) {
@@ -60,7 +73,7 @@ export async function POST(request: NextRequest) {
           mlResult.prediction === 1
             ? "Your bid is likely to win. Maintain your strategy!"
             : "Your bid may not be competitive. Consider optimizing costs or timeline.",
-          "ML-based recommendation: Review risk and compliance factors.",
+          ...explanationRecommendations(mlResult.explanation),
         ],
         riskAlerts: [],
         costOptimization: {},
@@ -68,10 +81,7 @@ export async function POST(request: NextRequest) {
       });
     }
 
-    // Fallback: existing logic
-    // Simulate AI analysis processing
-    await new Promise((resolve) => setTimeout(resolve, 2000));
-
+    // Fallback: existing logic, answered immediately
     // Calculate competitiveness score based on bid vs project budget
     const bidTotal = bidData.cost.total
       ? Number.parseFloat(bidData.cost.total)
@@ -113,6 +123,46 @@ export async function POST(request: NextRequest) {
   }
 }
 
+const FEATURE_LABELS: Record<string, string> = {
+  bid_total: "Total bid amount",
+  materials_cost: "Materials cost",
+  labor_cost: "Labor cost",
+  equipment_cost: "Equipment cost",
+  overhead_cost: "Overhead cost",
+  timeline_days: "Project timeline",
+  profit_margin: "Profit margin",
+  roi: "ROI",
+  contingency: "Contingency",
+};
+
+// Turns the ML API's per-feature contributions (win probability points,
+// largest first) into recommendations naming what drives the score
+function explanationRecommendations(explanation: any) {
+  if (!explanation?.contributions) {
+    return ["ML-based recommendation: Review risk and compliance factors."];
+  }
+  const contributions = Object.entries(explanation.contributions) as [
+    string,
+    number
+  ][];
+  const label = (name: string) => FEATURE_LABELS[name] || name.replace(/_/g, " ");
+  const points = (value: number) => Math.abs(Math.round(value * 100));
+  const recommendations = contributions
+    .filter(([, value]) => value <= -0.01)
+    .slice(0, 2)
+    .map(
+      ([name, value]) =>
+        `${label(name)} is lowering your win probability by about ${points(value)} points.`
+    );
+  const strongest = contributions.find(([, value]) => value >= 0.01);
+  if (strongest) {
+    recommendations.push(
+      `${label(strongest[0])} is your strongest factor (+${points(strongest[1])} points).`
+    );
+  }
+  return recommendations;
+}
+
 function generateRecommendations(project: any, bidData: any) {
   const recommendations = [];
 
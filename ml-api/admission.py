@@ -0,0 +1,198 @@
+import asyncio
+import math
+import os
+from collections import deque
+from time import perf_counter
+
+import metrics
+from schema import FastJSONResponse
+
+# Admission control for the scoring endpoints. At most ADMISSION_CONCURRENCY
+# scoring requests run at once; the rest wait in a bounded FIFO queue. A
+# request's deadline is X-Deadline-Ms (milliseconds from arrival) or, for
+# the interactive endpoints, ADMISSION_DEADLINE_MS; bulk endpoints, whose
+# service time depends on the upload, have none unless the caller sets
+# one. Requests are turned away before their body is read when they cannot
+# finish in time:
+#
+#   429  queue full: ADMISSION_MAX_QUEUE requests already waiting
+#   503  queue wait plus expected service time exceeds the deadline, or
+#        the deadline passed while waiting
+#
+# Both carry Retry-After and a JSON {"error", "reason", "expected_ms",
+# "deadline_ms"} body, so a caller can fall back at once instead of timing
+# out. Service time is smoothed per endpoint over the time requests hold a
+# slot; the expected queue wait is the expected service time of everything
+# admitted ahead, divided by the concurrency. Requests already running are
+# never cut off. Health, readiness, metrics and admin routes bypass
+# admission, so probes keep answering under overload.
+
+DEADLINE_HEADER = b"x-deadline-ms"
+INTERACTIVE_PATHS = frozenset(["/predict", "/predict_sweep", "/optimize_bid"])
+BULK_PATHS = frozenset(["/predict_batch", "/predict_stream", "/predict_columns"])
+SCORING_PATHS = INTERACTIVE_PATHS | BULK_PATHS
+
+SHED = metrics.REGISTRY.counter(
+    "ml_admission_shed_total", "Scoring requests rejected by admission control.", ["app", "endpoint", "reason"],
+)
+QUEUE_WAIT = metrics.REGISTRY.histogram(
+    "ml_admission_queue_wait_seconds", "Time admitted requests waited for a slot.", ["app", "endpoint"],
+)
+
+
+class Shed(Exception):
+    def __init__(self, status_code, reason, expected, deadline):
+        self.status_code = status_code
+        self.reason = reason
+        self.expected = expected
+        self.deadline = deadline
+
+
+class AdmissionController:
+    def __init__(self, concurrency=None, max_queue=None, deadline_ms=None):
+        self.concurrency = concurrency or int(os.environ.get("ADMISSION_CONCURRENCY", 64))
+        self.max_queue = max_queue if max_queue is not None else int(os.environ.get("ADMISSION_MAX_QUEUE", 256))
+        self.deadline = (deadline_ms or float(os.environ.get("ADMISSION_DEADLINE_MS", 1000))) / 1000
+        self.running = 0
+        self.queued = 0
+        # Futures of queued requests, oldest first; a cancelled one gave up
+        self.waiters = deque()
+        # Expected seconds of work admitted and not finished
+        self.backlog = 0.0
+        # Smoothed seconds a request holds a slot, per endpoint
+        self.service = {}
+        self.admitted = 0
+        self.shed = {}
+
+    def expected_wait(self):
+        if self.running < self.concurrency:
+            return 0.0
+        return self.backlog / self.concurrency
+
+    def stats(self):
+        return {
+            "concurrency": self.concurrency,
+            "max_queue": self.max_queue,
+            "deadline_ms": self.deadline * 1000,
+            "running": self.running,
+            "queued": self.queued,
+            "expected_wait_ms": self.expected_wait() * 1000,
+            "service_ms": {path: seconds * 1000 for path, seconds in self.service.items()},
+            "admitted": self.admitted,
+            "shed": dict(self.shed),
+        }
+
+    async def acquire(self, path, deadline):
+        # Waits for a slot; returns (expected service seconds, seconds waited).
+        # deadline None: wait as long as it takes
+        service = self.service.get(path, 0.0)
+        expected = self.expected_wait() + service
+        if deadline is None:
+            deadline = math.inf
+        if self.running < self.concurrency and not self.queued:
+            if service > deadline:
+                raise Shed(503, "deadline", expected, deadline)
+            self.running += 1
+            self.backlog += service
+            return service, 0.0
+        if self.queued >= self.max_queue:
+            raise Shed(429, "queue_full", expected, deadline)
+        if expected > deadline:
+            raise Shed(503, "deadline", expected, deadline)
+        start = perf_counter()
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        self.queued += 1
+        self.backlog += service
+        try:
+            # release() hands the slot over by resolving the future
+            await asyncio.wait_for(waiter, deadline - service if deadline < math.inf else None)
+        except asyncio.TimeoutError:
+            self.backlog -= service
+            raise Shed(503, "expired", expected, deadline)
+        except asyncio.CancelledError:
+            self.backlog -= service
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            self.queued -= 1
+        return service, perf_counter() - start
+
+    def release(self):
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                # The slot passes on; running stays the same
+                waiter.set_result(None)
+                return
+        self.running -= 1
+
+    def record(self, path, expected, seconds):
+        self.backlog -= expected
+        self.service[path] = self.service.get(path, seconds) + 0.2 * (seconds - self.service.get(path, seconds))
+
+
+class AdmissionMiddleware:
+    # Pure ASGI, so streamed responses hold their slot until the last byte
+    def __init__(self, app, name, controller):
+        self.app = app
+        self.name = name
+        self.controller = controller
+
+    def deadline(self, scope):
+        # Seconds, None for no deadline; raises ValueError for a bad header
+        for key, value in scope["headers"]:
+            if key == DEADLINE_HEADER:
+                deadline = float(value) / 1000
+                if not 0 < deadline < math.inf:
+                    raise ValueError(value)
+                return deadline
+        return self.controller.deadline if scope["path"] in INTERACTIVE_PATHS else None
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path")
+        if scope["type"] != "http" or scope["method"] != "POST" or path not in SCORING_PATHS:
+            return await self.app(scope, receive, send)
+        endpoint = path.lstrip("/")
+        try:
+            deadline = self.deadline(scope)
+        except ValueError:
+            response = FastJSONResponse({"error": "X-Deadline-Ms: must be a positive number"}, status_code=422)
+            return await response(scope, receive, send)
+        controller = self.controller
+        try:
+            expected, waited = await controller.acquire(path, deadline)
+        except Shed as e:
+            controller.shed[e.reason] = controller.shed.get(e.reason, 0) + 1
+            SHED.labels(self.name, endpoint, e.reason).inc()
+            metrics.REQUESTS.labels(self.name, endpoint, "", "shed").inc()
+            response = FastJSONResponse({
+                "error": "overloaded: admission queue full" if e.status_code == 429 else "overloaded: deadline cannot be met",
+                "reason": e.reason,
+                "expected_ms": e.expected * 1000,
+                "deadline_ms": e.deadline * 1000 if e.deadline < math.inf else None,
+            }, status_code=e.status_code, headers={"Retry-After": str(max(1, math.ceil(e.expected)))})
+            return await response(scope, receive, send)
+        controller.admitted += 1
+        QUEUE_WAIT.labels(self.name, endpoint).observe(waited)
+        start = perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            controller.record(path, expected, perf_counter() - start)
+            controller.release()
+
+
+def add_middleware(app, name, controller):
+    # Admission for the app's scoring routes, plus its gauges
+    app.add_middleware(AdmissionMiddleware, name=name, controller=controller)
+    metrics.REGISTRY.gauge(
+        "ml_admission_running", "Scoring requests holding an admission slot.", ["app"],
+    ).add_callback(lambda: {(name,): controller.running})
+    metrics.REGISTRY.gauge(
+        "ml_admission_queued", "Scoring requests waiting for an admission slot.", ["app"],
+    ).add_callback(lambda: {(name,): controller.queued})
+    metrics.REGISTRY.gauge(
+        "ml_admission_expected_wait_seconds", "Expected queue wait of a request arriving now.", ["app"],
+    ).add_callback(lambda: {(name,): controller.expected_wait()})
@@ -0,0 +1,97 @@
+import asyncio
+
+# Adaptive micro-batching for /predict. Concurrent single-bid requests are
+# collected for a short window and scored as one matrix; each caller awaits
+# its own future. The window follows the observed arrival rate: with sparse
+# traffic a request is flushed on the next loop iteration (no added
+# latency), and as requests arrive faster the batcher waits up to max_wait
+# for the batch to fill. Scoring runs on the InferenceExecutor when one is
+# given, and requests keep accumulating while a batch is being scored.
+
+
+class MicroBatcher:
+    def __init__(self, score, max_batch_size=64, max_wait=0.002, executor=None):
+        # score: list of n request items -> list of n results
+        self.score = score
+        self.executor = executor
+        self.tasks = set()
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.pending = []
+        self.flush_handle = None
+        # Smoothed time between arrivals, seeded as "idle"
+        self.interarrival = 1.0
+        self.last_arrival = None
+        self.batches = 0
+        self.rows = 0
+
+    def window(self):
+        # Wait only if at least one more request is expected within max_wait
+        if self.interarrival >= self.max_wait:
+            return 0.0
+        remaining = self.max_batch_size - len(self.pending)
+        return min(self.max_wait, self.interarrival * remaining)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "rows": self.rows,
+            "mean_batch_size": self.rows / self.batches if self.batches else 0.0,
+            "window_ms": self.window() * 1000,
+        }
+
+    async def submit(self, x):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if self.last_arrival is not None:
+            self.interarrival += 0.2 * (min(now - self.last_arrival, 1.0) - self.interarrival)
+        self.last_arrival = now
+
+        future = loop.create_future()
+        self.pending.append((x, future))
+        if len(self.pending) >= self.max_batch_size:
+            self.flush()
+        elif self.flush_handle is None:
+            window = self.window()
+            if window > 0:
+                self.flush_handle = loop.call_later(window, self.flush)
+            else:
+                self.flush_handle = loop.call_soon(self.flush)
+        return await future
+
+    def flush(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+        self.batches += 1
+        self.rows += len(batch)
+        items = [x for x, _ in batch]
+        if self.executor is None:
+            try:
+                self.resolve(batch, self.score(items))
+            except Exception as e:
+                self.fail(batch, e)
+        else:
+            task = asyncio.ensure_future(self.run(batch, items))
+            # Keep a reference until done so the task is not garbage collected
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def run(self, batch, items):
+        try:
+            self.resolve(batch, await self.executor.run(self.score, items))
+        except Exception as e:
+            self.fail(batch, e)
+
+    def resolve(self, batch, results):
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def fail(self, batch, e):
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(e)
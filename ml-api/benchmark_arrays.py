@@ -0,0 +1,120 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# Size on disk, load time and memory of the pickled models against the
+# memory-mapped .arrays directories the training scripts export. Every load
+# runs in a fresh interpreter, so nothing is cached in the process; memory
+# is the growth over the imports, right after loading and after scoring a
+# batch. Rss includes the mapped array pages read so far; anon is the
+# process-private heap only. Mapped pages are page cache: clean, shared by
+# every process mapping the same files and reclaimable under pressure.
+# --synthetic-trees N adds a full-depth forest of N trees, closer to what
+# a larger training set produces.
+# To run: python benchmark_arrays.py [--synthetic-trees 500]
+
+
+def disk_mb(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)) / 1e6
+    return os.path.getsize(path) / 1e6
+
+
+def memory():
+    # (Rss, Anonymous) of this process in MB
+    fields = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3:
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return fields["Rss"], fields["Anonymous"]
+
+
+def child(path):
+    # Runs in a fresh interpreter: load, score, report as JSON
+    from bundle import ModelBundle
+    from features import synthetic_bids
+
+    rows = synthetic_bids(256)
+    base_rss, base_anon = memory()
+    start = time.perf_counter()
+    bundle = ModelBundle.load(path)
+    load_ms = (time.perf_counter() - start) * 1000
+    load_rss, load_anon = memory()
+    bundle.score_rows(rows)
+    score_rss, score_anon = memory()
+    print(json.dumps({
+        "load_ms": load_ms,
+        "load_rss_mb": load_rss - base_rss, "load_anon_mb": load_anon - base_anon,
+        "score_rss_mb": score_rss - base_rss, "score_anon_mb": score_anon - base_anon,
+    }))
+
+
+def measure(path, repeat):
+    runs = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, __file__, "--child", path], capture_output=True, text=True, check=True)
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+
+
+def synthetic_forest(directory, n_trees):
+    # A full-depth forest on noisy synthetic bids, saved in both formats
+    from sklearn.ensemble import RandomForestClassifier
+
+    from bundle import save_arrays, save_bundle
+    from features import FEATURES, from_dicts, synthetic_bids
+
+    rows = synthetic_bids(20000)
+    X, _, _ = from_dicts(rows)
+    y = np.random.default_rng(42).integers(0, 2, len(X))
+    model = RandomForestClassifier(n_estimators=n_trees, random_state=42, n_jobs=-1).fit(X, y)
+    probabilities = model.predict_proba(X[:32])[:, 1]
+    pkl = os.path.join(directory, "synthetic_bundle.pkl")
+    arrays = os.path.join(directory, "synthetic.arrays")
+    save_bundle(pkl, model, FEATURES, [], rows[:32], probabilities)
+    save_arrays(arrays, model, FEATURES, [], rows[:32], probabilities)
+    return [(f"synthetic {n_trees} trees", pkl, arrays)]
+
+
+def benchmark_arrays(repeat, synthetic_trees):
+    print("Model Artifact Benchmark")
+    print("=" * 100)
+    pairs = [
+        ("model", "model.pkl", "model.arrays"),
+        ("model_advanced", "model_advanced_bundle.pkl", "model_advanced.arrays"),
+    ]
+    with tempfile.TemporaryDirectory() as directory:
+        if synthetic_trees:
+            pairs += synthetic_forest(directory, synthetic_trees)
+        print(f"{'model':22s} {'format':7s} {'disk_mb':>8s} {'load_ms':>8s} "
+              f"{'rss/anon after load':>20s} {'rss/anon after score':>21s}")
+        results = []
+        for name, pkl, arrays in pairs:
+            for fmt, path in (("pickle", pkl), ("arrays", arrays)):
+                result = {"model": name, "format": fmt, "disk_mb": disk_mb(path), **measure(path, repeat)}
+                results.append(result)
+                print(f"{name:22s} {fmt:7s} {result['disk_mb']:8.2f} {result['load_ms']:8.1f} "
+                      f"{result['load_rss_mb']:11.1f} /{result['load_anon_mb']:7.1f} "
+                      f"{result['score_rss_mb']:12.1f} /{result['score_anon_mb']:7.1f}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--synthetic-trees", type=int, default=0)
+    parser.add_argument("--child")
+    args = parser.parse_args()
+    if args.child:
+        child(args.child)
+    else:
+        benchmark_arrays(args.repeat, args.synthetic_trees)
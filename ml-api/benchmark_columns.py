@@ -0,0 +1,100 @@
+import argparse
+import http.client
+import json
+import subprocess
+import sys
+import time
+
+from benchmark_prefork import wait_ready
+from columnar import encode_columns
+from features import synthetic_bids
+
+# Rows per second of the three scoring paths of one server: JSON /predict
+# one row per request, JSON /predict_batch and binary /predict_columns at
+# a range of batch sizes. One keep-alive client, so the numbers are per
+# connection and include encoding the request and reading the response
+# on the client side. Batch requests are timed for a few seconds each,
+# /predict for the same time. Paths the module does not serve (main.py has
+# no /predict_batch) are skipped.
+# To run: python benchmark_columns.py --batch-sizes 100 1000 10000
+
+
+def rate(conn, path, body, headers, rows, seconds):
+    # Rows per second and response bytes of one request repeated
+    requests = 0
+    start = time.perf_counter()
+    while True:
+        conn.request("POST", path, body, headers)
+        response = conn.getresponse()
+        payload = response.read()
+        if response.status == 404:
+            return None, 0
+        if response.status != 200:
+            raise RuntimeError(f"{path}: {response.status} {payload[:200]!r}")
+        requests += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds:
+            return requests * rows / elapsed, len(payload)
+
+
+def single_rows(conn, rows, seconds):
+    bodies = [json.dumps({"features": row}).encode() for row in rows]
+    headers = {"Content-Type": "application/json"}
+    requests = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        conn.request("POST", "/predict", bodies[requests % len(bodies)], headers)
+        conn.getresponse().read()
+        requests += 1
+    return requests / (time.perf_counter() - start), sum(map(len, bodies)) / len(bodies)
+
+
+def benchmark_columns(module, batch_sizes, seconds, port):
+    print("Columnar Scoring Benchmark")
+    print("=" * 78)
+    command = [sys.executable, "-m", "uvicorn", f"{module}:app", "--port", str(port), "--log-level", "warning"]
+    server = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    results = []
+    try:
+        if not wait_ready(port):
+            raise RuntimeError(f"Server did not become ready: {' '.join(command)}")
+        conn = http.client.HTTPConnection("127.0.0.1", port)
+        print(f"{module}, 1 client, {seconds:.0f} s per path")
+        print(f"{'path':18s} {'rows/req':>8s} {'req bytes/row':>13s} {'resp bytes/row':>14s} {'rows/s':>10s} {'vs /predict':>11s}")
+
+        single, request_bytes = single_rows(conn, synthetic_bids(256), seconds)
+        results.append({"path": "/predict", "rows": 1, "request_bytes_per_row": request_bytes, "rows_per_s": single})
+        print(f"{'/predict':18s} {1:8d} {request_bytes:13.1f} {'':>14s} {single:10.0f} {1:10.1f}x")
+
+        for n_rows in batch_sizes:
+            rows = synthetic_bids(n_rows)
+            json_body = json.dumps({"features": rows}).encode()
+            columns_body, columns_headers = encode_columns({name: [row[name] for row in rows] for name in rows[0]})
+            paths = [
+                ("/predict_batch", json_body, {"Content-Type": "application/json"}),
+                ("/predict_columns", columns_body, columns_headers),
+            ]
+            for path, body, headers in paths:
+                rows_per_s, response_bytes = rate(conn, path, body, headers, n_rows, seconds)
+                if rows_per_s is None:
+                    continue
+                results.append({
+                    "path": path, "rows": n_rows, "request_bytes_per_row": len(body) / n_rows,
+                    "response_bytes_per_row": response_bytes / n_rows, "rows_per_s": rows_per_s,
+                })
+                print(f"{path:18s} {n_rows:8d} {len(body) / n_rows:13.1f} {response_bytes / n_rows:14.1f} "
+                      f"{rows_per_s:10.0f} {rows_per_s / single:10.1f}x")
+    finally:
+        server.terminate()
+        server.wait()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", default="main_advanced")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--seconds", type=float, default=3)
+    parser.add_argument("--port", type=int, default=8791)
+    args = parser.parse_args()
+    benchmark_columns(args.module, args.batch_sizes, args.seconds, args.port)
@@ -0,0 +1,82 @@
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from features import FEATURES, derive_raw_columns, from_dict, from_frame
+
+# Compares the shared NumPy feature pipeline against the pandas code it
+# replaced in train_model_advanced.py and main_advanced.py.
+# To run: python benchmark_features.py
+
+
+def pandas_training_features(df):
+    # Column-wise pandas derivation formerly in train_model_advanced.py
+    df = df.copy()
+    df['materials_ratio'] = df['materials_cost'] / df['bid_total']
+    df['labor_ratio'] = df['labor_cost'] / df['bid_total']
+    df['equipment_ratio'] = df['equipment_cost'] / df['bid_total']
+    df['overhead_ratio'] = df['overhead_cost'] / df['bid_total']
+    df['cost_per_day'] = df['bid_total'] / df['timeline_days'].replace(0, 1)
+    df['profit_per_day'] = (df['bid_total'] * df['profit_margin'] / 100) / df['timeline_days'].replace(0, 1)
+    df['high_risk'] = ((df['contingency'] > 15) | (df['timeline_days'] < 0)).astype(int)
+    df['low_margin'] = (df['profit_margin'] < 10).astype(int)
+    return df[FEATURES].fillna(0)
+
+
+def pandas_serving_features(data):
+    # Per-row DataFrame derivation formerly in main_advanced.engineer_features
+    df = pd.DataFrame([data])
+    df['materials_ratio'] = df['materials_cost'] / df['bid_total']
+    df['labor_ratio'] = df['labor_cost'] / df['bid_total']
+    df['equipment_ratio'] = df['equipment_cost'] / df['bid_total']
+    df['overhead_ratio'] = df['overhead_cost'] / df['bid_total']
+    df['cost_per_day'] = df['bid_total'] / (df['timeline_days'] if df['timeline_days'].iloc[0] != 0 else 1)
+    df['profit_per_day'] = (df['bid_total'] * df['profit_margin'] / 100) / (df['timeline_days'] if df['timeline_days'].iloc[0] != 0 else 1)
+    df['high_risk'] = int(df['contingency'].iloc[0] > 15 or df['timeline_days'].iloc[0] < 0)
+    df['low_margin'] = int(df['profit_margin'].iloc[0] < 10)
+    df['risk_count'] = data.get('risk_count', 0)
+    df['permit_count'] = data.get('permit_count', 0)
+    return df[FEATURES].fillna(0)
+
+
+def load_bids(csv_path='bids.csv'):
+    df = pd.read_csv(csv_path).rename(columns={"total_cost": "bid_total"})
+    return derive_raw_columns(df)
+
+
+def benchmark_features(csv_path='bids.csv', repeat=200):
+    df = load_bids(csv_path)
+    rows = df[FEATURES[:9] + ['risk_count', 'permit_count']].to_dict('records')
+
+    print("Feature Pipeline Benchmark")
+    print("=" * 50)
+    print(f"Rows: {len(df)}")
+
+    # Parity: whole export, then row by row
+    expected = pandas_training_features(df).to_numpy(dtype=float)
+    batch_match = np.array_equal(from_frame(df), expected)
+    row_match = all(
+        np.array_equal(from_dict(row), pandas_serving_features(row).to_numpy(dtype=float))
+        for row in rows
+    )
+    print(f"Batch output identical to training path: {batch_match}")
+    print(f"Single-row output identical to serving path: {row_match}")
+
+    # Timing
+    row = rows[0]
+    old_row = min(timeit.repeat(lambda: pandas_serving_features(row), number=repeat, repeat=3)) / repeat
+    new_row = min(timeit.repeat(lambda: from_dict(row), number=repeat, repeat=3)) / repeat
+    old_batch = min(timeit.repeat(lambda: pandas_training_features(df), number=20, repeat=3)) / 20
+    new_batch = min(timeit.repeat(lambda: from_frame(df), number=20, repeat=3)) / 20
+
+    print("-" * 50)
+    print(f"Single row, pandas:  {old_row * 1e6:10.1f} us")
+    print(f"Single row, numpy:   {new_row * 1e6:10.1f} us  ({old_row / new_row:.0f}x)")
+    print(f"Full export, pandas: {old_batch * 1e3:10.3f} ms")
+    print(f"Full export, numpy:  {new_batch * 1e3:10.3f} ms  ({old_batch / new_batch:.1f}x)")
+    return batch_match and row_match
+
+
+if __name__ == "__main__":
+    raise SystemExit(0 if benchmark_features() else 1)
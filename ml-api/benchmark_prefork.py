@@ -0,0 +1,117 @@
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from prefork import memory_mb
+from test_model_advanced import test_cases
+
+# Memory and throughput of prefork.py against `uvicorn --workers N`, for a
+# range of worker counts. Each server is started, driven with concurrent
+# keep-alive /predict clients for a few seconds, and the memory of its whole
+# process tree is summed. Pss is the number to size against: it splits
+# shared pages between the processes using them.
+# To run: python benchmark_prefork.py --workers 1 2 4
+
+
+def children(pid):
+    # The process and all its descendants
+    pids = [pid]
+    for task in os.listdir(f"/proc/{pid}/task"):
+        try:
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                for child in f.read().split():
+                    pids += children(int(child))
+        except OSError:
+            pass
+    return pids
+
+
+def wait_ready(port, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/readyz")
+            if conn.getresponse().status == 200:
+                return True
+        except OSError:
+            pass
+        time.sleep(0.2)
+    return False
+
+
+def drive(port, clients, seconds):
+    bodies = [json.dumps(case).encode() for case in test_cases]
+    counts = [0] * clients
+    stop = time.monotonic() + seconds
+
+    def client(i):
+        conn = http.client.HTTPConnection("127.0.0.1", port)
+        while time.monotonic() < stop:
+            conn.request("POST", "/predict", bodies[counts[i] % len(bodies)], {"Content-Type": "application/json"})
+            conn.getresponse().read()
+            counts[i] += 1
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / seconds
+
+
+def measure(command, port, workers, clients, seconds):
+    server = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_ready(port):
+            raise RuntimeError(f"Server did not become ready: {' '.join(command)}")
+        # Every worker must be up before measuring, not just the first one
+        time.sleep(2 + workers)
+        rate = drive(port, clients, seconds)
+        memory = [memory_mb(pid) for pid in children(server.pid)]
+        return {
+            "processes": len(memory),
+            "rss_mb": sum(m.get("rss_mb", 0) for m in memory),
+            "pss_mb": sum(m.get("pss_mb", 0) for m in memory),
+            "req_per_s": rate,
+        }
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def benchmark_prefork(worker_counts, module, clients, seconds, port):
+    print("Pre-fork Serving Benchmark")
+    print("=" * 72)
+    print(f"{module}, {clients} clients x {seconds:.0f} s, {os.cpu_count()} cores")
+    print(f"{'mode':10s} {'workers':>7s} {'procs':>5s} {'rss_mb':>8s} {'pss_mb':>8s} {'pss/worker':>10s} {'req/s':>8s}")
+    results = []
+    for workers in worker_counts:
+        modes = {
+            "prefork": [sys.executable, "prefork.py", module, "--workers", str(workers),
+                        "--port", str(port), "--report-seconds", "0"],
+            "uvicorn": [sys.executable, "-m", "uvicorn", f"{module}:app", "--workers", str(workers),
+                        "--port", str(port), "--log-level", "warning"],
+        }
+        for mode, command in modes.items():
+            result = measure(command, port, workers, clients, seconds)
+            results.append({"mode": mode, "workers": workers, **result})
+            print(f"{mode:10s} {workers:7d} {result['processes']:5d} {result['rss_mb']:8.1f} "
+                  f"{result['pss_mb']:8.1f} {result['pss_mb'] / workers:10.1f} {result['req_per_s']:8.1f}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--module", default="main_advanced")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--port", type=int, default=8790)
+    args = parser.parse_args()
+    benchmark_prefork(args.workers, args.module, args.clients, args.seconds, args.port)
@@ -0,0 +1,79 @@
+import json
+import timeit
+
+import numpy as np
+import orjson
+from fastapi.encoders import jsonable_encoder
+
+from features import N_FEATURES, fill_row, synthetic_bids
+from schema import ADVANCED_SCHEMA, parse_features
+
+# Parse-and-validate overhead of the typed schema against the previous
+# request.json() + dict indexing path, for one bid and a 256-bid batch, up
+# to the raw feature matrix (feature engineering is shared by both paths),
+# plus response serialization.
+# To run: python benchmark_schema.py
+
+
+def previous_single(body):
+    data = json.loads(body)
+    X = np.zeros((1, N_FEATURES))
+    fill_row(X, 0, data["features"])
+    return X
+
+
+def schema_single(body):
+    X = np.zeros((1, N_FEATURES))
+    ADVANCED_SCHEMA.fill(parse_features(body), X, 0)
+    return X
+
+
+def previous_batch(body):
+    rows = json.loads(body)["features"]
+    X = np.zeros((len(rows), N_FEATURES))
+    for i, row in enumerate(rows):
+        fill_row(X, i, row)
+    return X
+
+
+def schema_batch(body):
+    rows = parse_features(body)
+    X = np.zeros((len(rows), N_FEATURES))
+    for i, row in enumerate(rows):
+        ADVANCED_SCHEMA.fill(row, X, i)
+    return X
+
+
+def previous_response(results):
+    return json.dumps(jsonable_encoder(results)).encode()
+
+
+def schema_response(results):
+    return orjson.dumps(results)
+
+
+def per_call_us(fn, arg, number):
+    return min(timeit.repeat(lambda: fn(arg), number=number, repeat=5)) / number * 1e6
+
+
+def benchmark_schema():
+    bids = synthetic_bids(256)
+    single = json.dumps({"features": bids[0]}).encode()
+    batch = json.dumps({"features": bids}).encode()
+    results = {"results": [{"prediction": 1, "probability": 0.61, "model_version": "abc"}] * 256}
+
+    print("Request Parse + Validate Benchmark")
+    print("=" * 60)
+    cases = [
+        ("Single bid", previous_single, schema_single, single, 5000),
+        ("256-bid batch", previous_batch, schema_batch, batch, 200),
+        ("256-result response", previous_response, schema_response, results, 200),
+    ]
+    for name, previous, typed, arg, number in cases:
+        before = per_call_us(previous, arg, number)
+        after = per_call_us(typed, arg, number)
+        print(f"{name:20s} previous {before:9.1f} us   schema {after:9.1f} us   ({before / after:.1f}x)")
+
+
+if __name__ == "__main__":
+    benchmark_schema()
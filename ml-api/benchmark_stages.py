@@ -0,0 +1,164 @@
+import argparse
+import json
+import os
+import timeit
+
+import pandas as pd
+
+from benchmark_arrays import disk_mb, measure as measure_load
+from bundle import ModelBundle
+from features import BASE_FEATURES, COUNT_FEATURES, prepare_export
+
+# Offline micro-benchmarks of every inference stage, in-process and without
+# a server, with a regression gate:
+#
+#   engineer       request dicts -> feature matrix (bundle.featurize_rows)
+#   scale          only for a model given with a separate scaler file
+#                  (model:scaler); the shipped models fold their scaling
+#                  in and have no such stage
+#   predict_proba  compiled model
+#   predict        compiled model
+#
+# for batches of 1, 16, 256 and 4096 rows from bids.csv (cycled past its
+# length), plus load time and memory growth of each artifact in a fresh
+# interpreter (benchmark_arrays.measure). Times are the best per-call time
+# over several repeats.
+#
+# --save writes the results as the baseline; otherwise results are compared
+# with the baseline and the run fails when a measurement is more than
+# --threshold percent worse (and by more than a small absolute floor, so
+# microsecond noise does not count). Baselines are machine-specific; keep
+# one per machine, outside version control.
+# To run: python benchmark_stages.py --save      (record the baseline)
+#         python benchmark_stages.py             (compare against it)
+
+# What the servers load; a pickle with a separate scaler can still be given
+# as --models model.pkl:scaler.pkl
+MODELS = ["model.arrays", "model_advanced.arrays"]
+BATCH_SIZES = [1, 16, 256, 4096]
+# Regressions smaller than these never fail the gate
+FLOOR_US = 5.0
+FLOOR_LOAD_MS = 5.0
+FLOOR_MB = 1.0
+
+
+def bid_rows(csv_path, n):
+    df = prepare_export(pd.read_csv(csv_path))
+    rows = df[BASE_FEATURES + COUNT_FEATURES].to_dict('records')
+    return [rows[i % len(rows)] for i in range(n)]
+
+
+def per_call_us(fn, repeat):
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e6
+
+
+def stage_times(bundle, rows, repeat):
+    # {(stage, batch size): us per call}
+    times = {}
+    for size in BATCH_SIZES:
+        batch = rows[:size]
+        X, _, _ = bundle.featurize_rows(batch)
+        times[("engineer", size)] = per_call_us(lambda: bundle.featurize_rows(batch), repeat)
+        if bundle.scaler is not None:
+            times[("scale", size)] = per_call_us(lambda: bundle.scaler.transform(X), repeat)
+            X = bundle.scaler.transform(X)
+        times[("predict_proba", size)] = per_call_us(lambda: bundle.model.predict_proba(X), repeat)
+        times[("predict", size)] = per_call_us(lambda: bundle.model.predict(X), repeat)
+    return times
+
+
+def benchmark_model(spec, rows, repeat, load_repeat):
+    model_file, _, scaler_file = spec.partition(":")
+    bundle = ModelBundle.load(model_file, scaler_file or None, model_dir=".")
+    result = {
+        "timings_us": {f"{stage}/{size}": us for (stage, size), us in stage_times(bundle, rows, repeat).items()},
+        "disk_mb": disk_mb(model_file) + (disk_mb(scaler_file) if scaler_file else 0),
+    }
+    if not scaler_file:
+        # The child process loads by path only
+        result.update(measure_load(model_file, load_repeat))
+    return result
+
+
+def regressions(results, baseline, threshold):
+    # (model, measurement, before, after) worse than the threshold allows
+    found = []
+    for spec, result in results.items():
+        before = baseline.get(spec)
+        if before is None:
+            continue
+        pairs = [(f"{name} us", value, before["timings_us"].get(name), FLOOR_US)
+                 for name, value in result["timings_us"].items()]
+        pairs += [(name, result[name], before.get(name), FLOOR_MB if name.endswith("_mb") else FLOOR_LOAD_MS)
+                  for name in ("load_ms", "load_rss_mb", "score_rss_mb") if name in result]
+        for name, after, old, floor in pairs:
+            if old is not None and after > old * (1 + threshold / 100) and after - old > floor:
+                found.append((spec, name, old, after))
+    return found
+
+
+def benchmark_stages(models, csv_path, repeat, load_repeat, baseline_path, threshold, save):
+    print("Inference Stage Benchmark")
+    print("=" * 78)
+    rows = bid_rows(csv_path, max(BATCH_SIZES))
+    baseline = {}
+    if os.path.exists(baseline_path) and not save:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+
+    results = {}
+    for spec in models:
+        model_file = spec.partition(":")[0]
+        if not os.path.exists(model_file):
+            print(f"{spec}: not found, skipped")
+            continue
+        results[spec] = result = benchmark_model(spec, rows, repeat, load_repeat)
+        before = baseline.get(spec, {})
+        print(f"\n{spec}: {result['disk_mb']:.2f} MB on disk", end="")
+        if "load_ms" in result:
+            print(f", load {result['load_ms']:.1f} ms, rss +{result['load_rss_mb']:.1f} MB after load, "
+                  f"+{result['score_rss_mb']:.1f} MB after scoring", end="")
+        print()
+        stages = sorted({name.split("/")[0] for name in result["timings_us"]},
+                        key=["engineer", "scale", "predict_proba", "predict"].index)
+        print(f"  {'us per call':14s}" + "".join(f"{size:>18d}" for size in BATCH_SIZES))
+        for stage in stages:
+            cells = []
+            for size in BATCH_SIZES:
+                name = f"{stage}/{size}"
+                value = result["timings_us"][name]
+                old = before.get("timings_us", {}).get(name)
+                change = f" ({(value - old) / old:+4.0%})" if old else ""
+                cells.append(f"{value:10.1f}{change:>8s}")
+            print(f"  {stage:14s}" + "".join(cells))
+
+    if save:
+        with open(baseline_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nBaseline saved to {baseline_path}")
+        return True
+    if not baseline:
+        print(f"\nNo baseline at {baseline_path}; run with --save to record one")
+        return True
+    found = regressions(results, baseline, threshold)
+    print()
+    for spec, name, old, after in found:
+        print(f"REGRESSION {spec} {name}: {old:.3f} -> {after:.3f} ({(after - old) / old:+.0%})")
+    print(f"{len(found)} regression(s) beyond {threshold:g}% against {baseline_path}")
+    return not found
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--models", nargs="+", default=MODELS, help="model[:scaler] artifacts")
+    parser.add_argument("--csv", default="bids.csv")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--load-repeat", type=int, default=3)
+    parser.add_argument("--baseline", default="benchmark_baseline.json")
+    parser.add_argument("--threshold", type=float, default=25, help="percent slower that fails the run")
+    parser.add_argument("--save", action="store_true", help="record the results as the new baseline")
+    args = parser.parse_args()
+    ok = benchmark_stages(args.models, args.csv, args.repeat, args.load_repeat, args.baseline, args.threshold, args.save)
+    raise SystemExit(0 if ok else 1)
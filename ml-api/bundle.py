@@ -0,0 +1,328 @@
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import joblib
+import numpy as np
+import sklearn
+
+from executor import pin_n_jobs
+from features import BASE_FEATURES, FEATURES, N_FEATURES
+from forest import ARRAY_NAMES, CompiledModel, compile_model, compile_scaler
+from metrics import ENGINEER, EXPLAIN, PREDICT, PREDICT_PROBA, SCALER, SERIALIZE
+from schema import ADVANCED_SCHEMA, BASE_SCHEMA
+
+# A model and its (optional) scaler, loaded from MODEL_DIR and compiled
+# together under one version. Servers score through a bundle so the pair is
+# always consistent. The feature layout follows the model: 19 inputs use the
+# engineered features of main_advanced.py, anything else the 9 raw fields
+# of main.py.
+#
+# train_model_advanced.py writes a fused bundle file instead: a dict with
+# the estimator (any scaling inside it, e.g. a StandardScaler +
+# LogisticRegression pipeline, which compile_model folds into the
+# coefficients) and a manifest recording the feature order, the
+# preprocessing applied before the estimator and a parity sample of raw
+# bids with the probabilities sklearn gave them at training time. The
+# sample is re-scored through the serving path whenever the file is saved
+# or loaded, and a mismatch rejects the file.
+#
+# The training scripts also export the compiled model as an array directory
+# (save_arrays), which is what the servers load by default:
+#
+#   model_advanced.arrays/
+#       manifest.json   format, compiled model header, array dtypes /
+#                       shapes / hashes and the bundle manifest above
+#       feature.npy     uint8 split feature per node
+#       threshold.npy   float32 split threshold per node
+#       children.npy    int32 right / left child per node
+#       value.npy       float64 leaf value per node
+#       roots.npy       int32 root node per tree
+#
+# The .npy files are memory-mapped read-only: loading reads the manifest
+# and the pages the parity check touches, the rest come in on first use,
+# and every server process mapping the directory shares one copy in the
+# page cache. The version is the hash of manifest.json, which records the
+# sha1 of every array file; with MODEL_VERIFY_HASHES=1 each file is read
+# and checked against it on load (off by default, as it reads every page).
+
+MODEL_DIR = os.environ.get("MODEL_DIR", ".")
+VERIFY_HASHES = os.environ.get("MODEL_VERIFY_HASHES", "0") == "1"
+
+BUNDLE_FORMAT = "nirman-model-bundle/1"
+ARRAYS_FORMAT = "nirman-model-arrays/1"
+ARRAYS_MANIFEST = "manifest.json"
+PARITY_TOLERANCE = 1e-9
+
+
+def artifact_path(name, model_dir=None):
+    return os.path.join(model_dir or MODEL_DIR, name)
+
+
+def artifact_version(*contents):
+    # Short content hash of the artifact files, used as the model version
+    digest = hashlib.sha1()
+    for content in contents:
+        digest.update(content)
+    return digest.hexdigest()[:12]
+
+
+class ModelBundle:
+    def __init__(self, model, scaler=None, version=None, paths=(), manifest=None):
+        self.model = compile_model(pin_n_jobs(model))
+        self.scaler = compile_scaler(scaler) if scaler is not None else None
+        self.version = version
+        self.paths = list(paths)
+        self.manifest = manifest
+        self.n_features = model.n_features_in_
+        if manifest is not None:
+            if manifest["features"] == FEATURES:
+                self.engineered = True
+            elif manifest["features"] == BASE_FEATURES:
+                self.engineered = False
+            else:
+                raise ValueError("Bundle feature order does not match this server's feature pipeline")
+        else:
+            self.engineered = self.n_features == N_FEATURES
+        self.schema = ADVANCED_SCHEMA if self.engineered else BASE_SCHEMA
+        self.features = FEATURES if self.engineered else BASE_FEATURES
+
+    @classmethod
+    def load(cls, model_file, scaler_file=None, model_dir=None):
+        if os.path.isdir(artifact_path(model_file, model_dir)):
+            if scaler_file:
+                raise ValueError("Array model directories have their scaling folded in; no scaler file is used")
+            return cls.load_arrays(artifact_path(model_file, model_dir))
+        paths = [artifact_path(model_file, model_dir)]
+        if scaler_file:
+            paths.append(artifact_path(scaler_file, model_dir))
+        # Each file is read once, so the version always matches what was loaded
+        contents = []
+        for path in paths:
+            with open(path, "rb") as f:
+                contents.append(f.read())
+        model = joblib.load(io.BytesIO(contents[0]))
+        scaler = joblib.load(io.BytesIO(contents[1])) if scaler_file else None
+        version = artifact_version(*contents)
+        if isinstance(model, dict) and model.get("format") == BUNDLE_FORMAT:
+            bundle = cls(model["model"], scaler, version=version, paths=paths, manifest=model["manifest"])
+            bundle.parity_diff = bundle.check_parity()
+            return bundle
+        return cls(model, scaler, version=version, paths=paths)
+
+    @classmethod
+    def load_arrays(cls, path, verify_hashes=None):
+        manifest_path = os.path.join(path, ARRAYS_MANIFEST)
+        with open(manifest_path, "rb") as f:
+            content = f.read()
+        header = json.loads(content)
+        if header.get("format") != ARRAYS_FORMAT:
+            raise ValueError(f"{path} is not a {ARRAYS_FORMAT} directory")
+        if verify_hashes is None:
+            verify_hashes = VERIFY_HASHES
+        arrays = {}
+        for name, spec in header["arrays"].items():
+            file_path = os.path.join(path, spec["file"])
+            if verify_hashes:
+                with open(file_path, "rb") as f:
+                    if hashlib.sha1(f.read()).hexdigest() != spec["sha1"]:
+                        raise ValueError(f"{spec['file']} in {path} does not match its manifest hash")
+            # Empty arrays (a model without trees) cannot be mapped
+            mmap_mode = "r" if np.prod(spec["shape"]) else None
+            array = np.load(file_path, mmap_mode=mmap_mode)
+            if str(array.dtype) != spec["dtype"] or list(array.shape) != spec["shape"]:
+                raise ValueError(f"{spec['file']} in {path} does not match its manifest")
+            arrays[name] = array
+        model = CompiledModel.from_arrays(header["model"], arrays)
+        model.shared = path
+        bundle = cls(model, version=artifact_version(content), paths=[manifest_path], manifest=header["manifest"])
+        bundle.parity_diff = bundle.check_parity()
+        return bundle
+
+    def share(self):
+        # Compiled node arrays into shared memory before forking workers
+        # (prefork.py); models that did not compile stay as they are
+        if hasattr(self.model, "share"):
+            self.model.share()
+        return self
+
+    def check_parity(self):
+        # Raw parity bids through featurization and the compiled model must
+        # reproduce the training-time sklearn probabilities
+        parity = self.manifest["parity"]
+        X, _, errors = self.featurize_rows(parity["rows"])
+        if errors:
+            raise ValueError(f"Parity bids could not be featurized: {errors}")
+        diff = np.abs(self.predict_proba(X)[:, 1] - np.asarray(parity["probabilities"]))
+        if diff.max(initial=0.0) > PARITY_TOLERANCE:
+            raise ValueError(f"Train/serve parity check failed: max probability difference {diff.max():.3g}")
+        return float(diff.max(initial=0.0))
+
+    def predict_proba(self, X):
+        if self.scaler is not None:
+            with SCALER.time():
+                X = self.scaler.transform(X)
+        with PREDICT_PROBA.time():
+            return self.model.predict_proba(X)
+
+    def score_arrays(self, X):
+        # One predict_proba call serves both the labels and the probability
+        # of each label; the predict stage times the whole model call
+        with PREDICT.time():
+            proba = self.predict_proba(X)
+            return self.model.classes_[proba.argmax(axis=1)], proba.max(axis=1)
+
+    def score(self, X):
+        predictions, probabilities = self.score_arrays(X)
+        # Building the result dicts counts as serialization, not prediction
+        with SERIALIZE.time():
+            return [
+                {"prediction": int(prediction), "probability": float(probability), "model_version": self.version}
+                for prediction, probability in zip(predictions, probabilities)
+            ]
+
+    def explain(self, X):
+        # score() plus an explanation per row (schema.Explanation)
+        if not hasattr(self.model, "explain"):
+            raise ValueError("Explanations need a compiled model")
+        if self.scaler is not None:
+            with SCALER.time():
+                X = self.scaler.transform(X)
+        with EXPLAIN.time():
+            base, contributions = self.model.explain(X)
+            results = []
+            for row_base, row in zip(base, contributions):
+                p = row_base + row.sum()
+                results.append({
+                    "prediction": int(self.model.classes_[int(p > 0.5)]),
+                    "probability": float(max(p, 1.0 - p)),
+                    "model_version": self.version,
+                    "explanation": {
+                        "base": float(row_base),
+                        "contributions": {self.features[j]: float(row[j]) for j in np.argsort(-np.abs(row))},
+                    },
+                })
+            return results
+
+    def sweep(self, features, axes):
+        # Class-1 probability of one bid and over a grid of its fields
+        # (schema.grid_matrix), in one model call; returns (base, surface)
+        # with one surface dimension per axis
+        with ENGINEER.time():
+            X = np.vstack([self.schema.grid_matrix(features, axes), self.schema.matrix(features)])
+        p = self.predict_proba(X)[:, 1]
+        return float(p[-1]), np.ascontiguousarray(p[:-1]).reshape([len(values) for _, values in axes])
+
+    def featurize(self, row):
+        # One request dict as a feature vector for this model
+        with ENGINEER.time():
+            return self.schema.matrix(row)[0]
+
+    def featurize_rows(self, rows):
+        with ENGINEER.time():
+            return self.schema.batch_matrix(rows)
+
+    def score_rows(self, rows, explain=False):
+        # Feature engineering and scoring for a list of request dicts; rows
+        # that fail to parse get an error entry in place
+        return self._score_valid(*self.featurize_rows(rows), explain=explain)
+
+    def score_frame(self, df):
+        # Same for a prepared bids export DataFrame
+        with ENGINEER.time():
+            featurized = self.schema.frame_matrix(df)
+        return self._score_valid(*featurized)
+
+    def _score_valid(self, X, valid, errors, explain=False):
+        results = [{"error": errors[i]} if i in errors else None for i in range(len(valid))]
+        if len(X):
+            scored = self.explain(X) if explain else self.score(X)
+            for i, result in zip(np.flatnonzero(valid), scored):
+                results[i] = result
+        return results
+
+
+def _manifest(features, preprocessing, rows, probabilities):
+    return {
+        "features": list(features),
+        "preprocessing": list(preprocessing),
+        "parity": {
+            "rows": [{name: float(value) for name, value in row.items()} for row in rows],
+            "probabilities": [float(p) for p in probabilities],
+        },
+        "sklearn_version": sklearn.__version__,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+
+
+def save_bundle(path, model, features, preprocessing, rows, probabilities):
+    # Write a fused bundle for a fitted model. rows are raw request dicts
+    # and probabilities the class-1 probabilities the model gives them on
+    # the training pipeline's feature matrix. The file is written next to
+    # path, loaded back through ModelBundle.load (which runs the parity
+    # check) and only then moved into place; returns the max difference.
+    manifest = _manifest(features, preprocessing, rows, probabilities)
+    directory, name = os.path.split(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{name}.", dir=directory)
+    os.close(fd)
+    try:
+        joblib.dump({"format": BUNDLE_FORMAT, "manifest": manifest, "model": model}, tmp_path)
+        diff = ModelBundle.load(tmp_path).parity_diff
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return diff
+
+
+def save_arrays(path, model, features, preprocessing, rows, probabilities):
+    # Same for an array directory, with the same arguments as save_bundle.
+    # The directory is built and checked next to path, then swapped in by
+    # renames: files are never rewritten in place, so servers still mapping
+    # the previous arrays keep reading them until they reload.
+    compiled = compile_model(model)
+    if not isinstance(compiled, CompiledModel):
+        raise TypeError(f"{type(model).__name__} cannot be exported as node arrays")
+    directory, name = os.path.split(os.path.abspath(path))
+    tmp_path = tempfile.mkdtemp(prefix=f".{name}.", dir=directory)
+    os.chmod(tmp_path, 0o755)
+    old_path = None
+    try:
+        arrays = {}
+        for array_name in ARRAY_NAMES:
+            array = getattr(compiled, array_name)
+            file_name = f"{array_name}.npy"
+            np.save(os.path.join(tmp_path, file_name), array)
+            with open(os.path.join(tmp_path, file_name), "rb") as f:
+                digest = hashlib.sha1(f.read()).hexdigest()
+            arrays[array_name] = {
+                "file": file_name, "dtype": str(array.dtype), "shape": list(array.shape), "sha1": digest,
+            }
+        header = {
+            "format": ARRAYS_FORMAT,
+            "model": compiled.header(),
+            "arrays": arrays,
+            "manifest": _manifest(features, preprocessing, rows, probabilities),
+        }
+        with open(os.path.join(tmp_path, ARRAYS_MANIFEST), "w") as f:
+            json.dump(header, f, indent=1)
+        diff = ModelBundle.load_arrays(tmp_path).parity_diff
+        if os.path.exists(path):
+            # rename() replaces an empty directory
+            old_path = tempfile.mkdtemp(prefix=f".{name}.old.", dir=directory)
+            os.rename(path, old_path)
+        os.rename(tmp_path, path)
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        if old_path is not None and not os.path.exists(path):
+            os.rename(old_path, path)
+            old_path = None
+        raise
+    finally:
+        if old_path is not None:
+            shutil.rmtree(old_path, ignore_errors=True)
+    return diff
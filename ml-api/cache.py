@@ -0,0 +1,107 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# In-process prediction cache for /predict. Keys are the model version plus
+# the feature vector rounded to `decimals` places, so re-submitting the same
+# bid (or one that differs only in fields the model ignores) is answered
+# without touching the model. Entries expire after `ttl` seconds and the
+# least recently used entry is evicted beyond `max_size`. Identical requests
+# that arrive while the first is still being scored share its result; if
+# the first is cancelled, they score the bid again.
+#
+# All methods run on the event loop thread, so no locking is needed.
+
+
+class PredictionCache:
+    def __init__(self, max_size=4096, ttl=300.0, decimals=6):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.decimals = decimals
+        self.entries = OrderedDict()  # key -> (expires_at, result)
+        self.in_flight = {}  # key -> future
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def key(self, version, x):
+        x = np.round(np.asarray(x, dtype=float), self.decimals)
+        # -0.0 and 0.0 must share a key
+        x[x == 0] = 0.0
+        return version, x.tobytes()
+
+    def stats(self):
+        return {
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        if expires_at < time.monotonic():
+            del self.entries[key]
+            self.expirations += 1
+            return None
+        self.entries.move_to_end(key)
+        return result
+
+    def put(self, key, result):
+        self.entries[key] = (time.monotonic() + self.ttl, result)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_compute(self, key, compute):
+        # compute: zero-argument coroutine function producing the result
+        if self.max_size <= 0:
+            return await compute()
+        result = self.get(key)
+        if result is not None:
+            self.hits += 1
+            return result
+        future = self.in_flight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # The first request was cancelled (its client went away);
+                # score again unless this request is being cancelled too
+                if not future.cancelled() or asyncio.current_task().cancelling():
+                    raise
+            return await self.get_or_compute(key, compute)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = future
+        try:
+            result = await compute()
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so a failure nobody else awaited is not logged
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            if "error" not in result:
+                self.put(key, result)
+            return result
+        finally:
+            # Also reached on cancellation, which `except Exception` does not
+            # catch: the waiters must not be left on an unresolved future
+            self.in_flight.pop(key, None)
+            if not future.done():
+                future.cancel()
@@ -0,0 +1,144 @@
+import time
+
+import numpy as np
+from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier, VotingClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import cross_val_score
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+
+from forest import ARRAY_NAMES, CompiledModel, compile_model
+
+# Accuracy / cost trade-off of the advanced ensemble, for
+# train_model_advanced.py when COMPRESSION_TOLERANCE is set. Smaller
+# variants of the soft-voting ensemble are fitted on the same split:
+# fewer and shallower random forest trees, fewer and shallower boosting
+# stages, and every subset of the three estimators.
+# (A forest of k trees with the same random_state is the first k trees of
+# the full forest, so tree subsets need no separate pruning step.) Each
+# variant is compiled like the servers compile it and measured for
+# accuracy, compiled node-array size and single-row / batch predict_proba
+# latency. Accuracy is the cross-validated accuracy on the training split,
+# as in the script's model comparison; the test split is a handful of bids
+# and its accuracy is reported alongside only. All variants are printed
+# with the Pareto-optimal ones marked. The variant returned is the smallest
+# tree-based one (the linear model alone compiles to no trees) whose
+# accuracy is within the tolerance of the better of the full ensemble and
+# the reference, the script's tuned single model, so compression never
+# settles for an accuracy that model already beats. When no variant gets
+# there, the most accurate tree-based one is returned with a warning.
+
+FOREST_SIZES = [(100, None), (50, None), (25, 8), (10, 6), (10, 4)]  # (trees, max_depth)
+BOOSTING_SIZES = [(100, 3), (50, 3), (25, 2)]  # (stages, max_depth)
+ESTIMATOR_SETS = [('rf', 'gb', 'lr'), ('rf', 'gb'), ('rf', 'lr'), ('gb', 'lr'), ('rf',), ('gb',), ('lr',)]
+BATCH_ROWS = 256
+CV_FOLDS = 3
+
+
+def candidates():
+    # (description, unfitted ensemble); the first is the full ensemble
+    for names in ESTIMATOR_SETS:
+        forest_sizes = FOREST_SIZES if 'rf' in names else [None]
+        boosting_sizes = BOOSTING_SIZES if 'gb' in names else [None]
+        for forest_size in forest_sizes:
+            for boosting_size in boosting_sizes:
+                estimators, parts = [], []
+                if forest_size is not None:
+                    trees, depth = forest_size
+                    estimators.append(('rf', RandomForestClassifier(n_estimators=trees, max_depth=depth, random_state=42)))
+                    parts.append(f"rf {trees}x{depth or 'full'}")
+                if boosting_size is not None:
+                    stages, depth = boosting_size
+                    estimators.append(('gb', GradientBoostingClassifier(n_estimators=stages, max_depth=depth, random_state=42)))
+                    parts.append(f"gb {stages}x{depth}")
+                if 'lr' in names:
+                    estimators.append(('lr', make_pipeline(StandardScaler(), LogisticRegression(random_state=42))))
+                    parts.append("lr")
+                yield " + ".join(parts), VotingClassifier(estimators=estimators, voting='soft')
+
+
+def latency_ms(fn, X, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(X)
+        samples.append(time.perf_counter() - start)
+    return float(np.percentile(samples, 50) * 1000), float(np.percentile(samples, 99) * 1000)
+
+
+def measure(model, X_test, y_test):
+    compiled = compile_model(model)
+    if not isinstance(compiled, CompiledModel):
+        raise TypeError(f"{type(model).__name__} does not compile")
+    X_test = np.asarray(X_test, dtype=float)
+    batch = np.resize(X_test, (BATCH_ROWS, X_test.shape[1]))
+    single_p50, single_p99 = latency_ms(compiled.predict_proba, X_test[:1], repeat=200)
+    batch_p50, _ = latency_ms(compiled.predict_proba, batch, repeat=50)
+    return {
+        "test_accuracy": float(np.mean(compiled.predict(X_test) == np.asarray(y_test))),
+        "trees": len(compiled.roots),
+        "nodes": len(compiled.feature),
+        "size_kb": sum(getattr(compiled, name).nbytes for name in ARRAY_NAMES) / 1024,
+        "single_p50_ms": single_p50,
+        "single_p99_ms": single_p99,
+        "batch_p50_ms": batch_p50,
+    }
+
+
+def pareto(results):
+    # Results no other result beats on size, latency and accuracy at once
+    def dominates(a, b):
+        no_worse = (a["size_kb"] <= b["size_kb"] and a["single_p50_ms"] <= b["single_p50_ms"]
+                    and a["accuracy"] >= b["accuracy"])
+        better = (a["size_kb"] < b["size_kb"] or a["single_p50_ms"] < b["single_p50_ms"]
+                  or a["accuracy"] > b["accuracy"])
+        return no_worse and better
+    return [r for r in results if not any(dominates(other, r) for other in results)]
+
+
+def compress(X_train, y_train, X_test, y_test, tolerance, budget_ms=None, reference=None):
+    # reference: (name, cv accuracy) of the model to beat, if any. Returns
+    # (chosen fitted ensemble, its measurements, all measurements)
+    results = []
+    for name, model in candidates():
+        accuracy = float(cross_val_score(model, X_train, y_train, cv=CV_FOLDS).mean())
+        model.fit(X_train, y_train)
+        results.append({"name": name, "model": model, "accuracy": accuracy, **measure(model, X_test, y_test)})
+    full = results[0]
+    front = pareto(results)
+
+    print(f"{len(results)} variants, * = Pareto-optimal on size, single-row latency and accuracy")
+    print(f"  {'variant':32s} {'trees':>5s} {'nodes':>6s} {'size_kb':>8s} {'1 row p50/p99 ms':>17s} "
+          f"{BATCH_ROWS:>4d} rows ms {'cv acc':>7s} {'test acc':>8s}")
+    for r in sorted(results, key=lambda r: (r["size_kb"], r["single_p50_ms"])):
+        print(f"{'*' if r in front else ' '} {r['name']:32s} {r['trees']:5d} {r['nodes']:6d} {r['size_kb']:8.1f} "
+              f"{r['single_p50_ms']:8.3f} /{r['single_p99_ms']:7.3f} {r['batch_p50_ms']:12.3f} "
+              f"{r['accuracy']:7.3f} {r['test_accuracy']:8.3f}")
+
+    print(f"\nFull ensemble: {full['name']}, cv accuracy {full['accuracy']:.3f}, {full['size_kb']:.1f} KB, "
+          f"single row p99 {full['single_p99_ms']:.3f} ms")
+    target_name, target = "full ensemble", full["accuracy"]
+    if reference is not None:
+        print(f"Reference: {reference[0]}, cv accuracy {reference[1]:.3f}")
+        if reference[1] > target:
+            target_name, target = reference
+    floor = target - tolerance
+    trees = [r for r in results if r["trees"] > 0]
+    within = [r for r in trees if r["accuracy"] >= floor - 1e-12]
+    if within:
+        chosen = min(within, key=lambda r: (r["size_kb"], r["single_p50_ms"]))
+        rule = f"smallest tree-based variant with cv accuracy >= {floor:.3f} ({target_name})"
+    else:
+        chosen = max(trees, key=lambda r: (r["accuracy"], -r["size_kb"]))
+        rule = "most accurate tree-based variant"
+        print(f"Warning: no tree-based variant reaches cv accuracy {floor:.3f} ({target_name})")
+
+    print("\n" + "=" * 78)
+    print(f"CHOSEN MODEL: {chosen['name']}")
+    print(f"  {rule}")
+    print(f"  cv accuracy {chosen['accuracy']:.3f}, test accuracy {chosen['test_accuracy']:.3f}, "
+          f"{chosen['trees']} trees, {chosen['size_kb']:.1f} KB, single row p99 {chosen['single_p99_ms']:.3f} ms")
+    print("=" * 78)
+    if budget_ms is not None and chosen["single_p99_ms"] > budget_ms:
+        print(f"Warning: single row p99 exceeds the {budget_ms:g} ms budget")
+    return chosen["model"], chosen, results
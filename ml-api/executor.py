@@ -0,0 +1,65 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from threadpoolctl import threadpool_limits
+
+# Runs feature engineering and model calls off the asyncio event loop, so a
+# slow evaluation never stalls request parsing or accept handling.
+#
+# INFERENCE_WORKERS  number of worker threads (default: number of cores)
+#
+# Workers are threads: scoring closes over the live, hot-swappable model
+# bundles, which forked pool processes would not see.
+
+
+def _init_worker():
+    # One pool worker per core; BLAS / OpenMP threads inside a worker would
+    # only oversubscribe the machine
+    threadpool_limits(1)
+
+
+def pin_n_jobs(model):
+    # Same for estimator-level parallelism (RandomForest n_jobs etc.)
+    if hasattr(model, 'n_jobs'):
+        model.n_jobs = 1
+    for est in getattr(model, 'estimators_', []):
+        if hasattr(est, 'n_jobs'):
+            pin_n_jobs(est)
+    return model
+
+
+class InferenceExecutor:
+    def __init__(self, workers=None):
+        self.workers = workers or int(os.environ.get("INFERENCE_WORKERS", os.cpu_count() or 1))
+        self.pool = ThreadPoolExecutor(
+            max_workers=self.workers,
+            thread_name_prefix="inference",
+            initializer=_init_worker,
+        )
+        # Calls submitted but not yet finished; the pool runs at most
+        # `workers` of them, the rest wait in its queue
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.completed = 0
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "queue_depth": max(0, self.in_flight - self.workers),
+            "max_in_flight": self.max_in_flight,
+            "completed": self.completed,
+        }
+
+    async def run(self, fn, *args):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.pool, fn, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True)
@@ -0,0 +1,181 @@
+import numpy as np
+import pandas as pd
+
+# Shared feature pipeline for train_model_advanced.py and main_advanced.py.
+# Everything works on plain (N, 19) float arrays so that one bid and a whole
+# export go through exactly the same column-wise code.
+
+# Raw bid fields supplied by callers
+BASE_FEATURES = [
+    'bid_total', 'materials_cost', 'labor_cost', 'equipment_cost', 'overhead_cost',
+    'timeline_days', 'profit_margin', 'roi', 'contingency'
+]
+
+# Text-based counts (optional, 0 if not provided)
+COUNT_FEATURES = ['risk_count', 'permit_count']
+
+# The features must match the order in the training script
+FEATURES = BASE_FEATURES + [
+    'materials_ratio', 'labor_ratio', 'equipment_ratio', 'overhead_ratio',
+    'cost_per_day', 'profit_per_day', 'high_risk', 'low_margin'
+] + COUNT_FEATURES
+
+N_FEATURES = len(FEATURES)
+N_BASE = len(BASE_FEATURES)
+
+# Column positions used by engineer()
+BID_TOTAL, TIMELINE_DAYS, PROFIT_MARGIN, CONTINGENCY = 0, 5, 6, 8
+RATIOS = slice(9, 13)
+COST_PER_DAY, PROFIT_PER_DAY, HIGH_RISK, LOW_MARGIN = 13, 14, 15, 16
+RISK_COUNT, PERMIT_COUNT = 17, 18
+
+
+def engineer(X):
+    # Fill the derived columns of an (N, 19) matrix in place from its raw
+    # columns (0-8 and 17-18) and return it
+    bid_total, timeline_days = X[:, BID_TOTAL], X[:, TIMELINE_DAYS]
+    profit_margin, contingency = X[:, PROFIT_MARGIN], X[:, CONTINGENCY]
+    days = np.where(timeline_days != 0, timeline_days, 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Ratios
+        X[:, RATIOS] = X[:, 1:5] / bid_total[:, None]
+        # Efficiency
+        X[:, COST_PER_DAY] = bid_total / days
+        X[:, PROFIT_PER_DAY] = (bid_total * profit_margin / 100) / days
+    # Risk indicators
+    X[:, HIGH_RISK] = (contingency > 15) | (timeline_days < 0)
+    X[:, LOW_MARGIN] = profit_margin < 10
+    # Fill missing
+    X[np.isnan(X)] = 0
+    return X
+
+
+def _value(v):
+    return np.nan if v is None else v
+
+
+def fill_row(X, i, row):
+    # Copy one request dict into row i; missing base fields raise KeyError
+    X[i, :N_BASE] = [_value(row[name]) for name in BASE_FEATURES]
+    X[i, RISK_COUNT] = _value(row.get('risk_count', 0))
+    X[i, PERMIT_COUNT] = _value(row.get('permit_count', 0))
+
+
+def from_dict(row):
+    X = np.zeros((1, N_FEATURES))
+    fill_row(X, 0, row)
+    return engineer(X)
+
+
+def _collect(rows, n_features, fill):
+    # Rows that cannot be parsed are reported by index and left out of X
+    X = np.zeros((len(rows), n_features))
+    errors = {}
+    for i, row in enumerate(rows):
+        try:
+            fill(X, i, row)
+        except Exception as e:
+            errors[i] = str(e)
+    valid = np.ones(len(rows), dtype=bool)
+    if errors:
+        valid[list(errors)] = False
+        X = X[valid]
+    return X, valid, errors
+
+
+def from_dicts(rows):
+    X, valid, errors = _collect(rows, N_FEATURES, fill_row)
+    return engineer(X), valid, errors
+
+
+def _fill_base_row(X, i, row):
+    X[i] = [_value(row[name]) for name in BASE_FEATURES]
+
+
+def base_from_dict(row):
+    X = np.zeros((1, N_BASE))
+    _fill_base_row(X, 0, row)
+    return X
+
+
+def base_from_dicts(rows):
+    # The 9 raw features only, as used by model.pkl
+    return _collect(rows, N_BASE, _fill_base_row)
+
+
+def _keep_sent(df, name, derived):
+    # The derived column, except in rows that already carry `name` (mixed
+    # NDJSON: some records send it, some only its source columns)
+    if name in df.columns:
+        sent = df[name].notna() & (df[name] != "")
+        derived = df[name].where(sent, derived)
+    df[name] = derived
+
+
+def derive_raw_columns(df):
+    # timeline_days, risk_count and permit_count from the columns of a bids
+    # export (start/completion dates, newline-separated risk and permit text).
+    # A row that carries a derived column itself keeps it. Dates are parsed
+    # row by row: an unparseable one leaves that row's timeline_days NaN,
+    # which the feature schemas reject for that row only.
+    if 'start_date' in df.columns and 'completion_date' in df.columns:
+        days = (
+            pd.to_datetime(df['completion_date'], errors='coerce', format='mixed')
+            - pd.to_datetime(df['start_date'], errors='coerce', format='mixed')
+        ).dt.days
+        _keep_sent(df, 'timeline_days', days)
+    elif 'timeline_days' not in df.columns:
+        df['timeline_days'] = 0
+
+    if 'technical_risks' in df.columns:
+        _keep_sent(df, 'risk_count', df['technical_risks'].astype(str).str.count('\\n') + 1)
+    elif 'risk_count' not in df.columns:
+        df['risk_count'] = 0
+
+    if 'permits' in df.columns:
+        _keep_sent(df, 'permit_count', df['permits'].astype(str).str.count('\\n') + 1)
+    elif 'permit_count' not in df.columns:
+        df['permit_count'] = 0
+    return df
+
+
+# Column names of the bids export that differ from the feature names
+EXPORT_RENAMES = {'total_cost': 'bid_total'}
+
+
+def prepare_export(df):
+    # Raw feature columns from a bids export, prepared exactly as
+    # train_model_advanced.py prepares bids.csv
+    return derive_raw_columns(df.rename(columns=EXPORT_RENAMES))
+
+
+def from_frame(df):
+    # (N, 19) matrix from a DataFrame holding the raw feature columns
+    X = np.zeros((len(df), N_FEATURES))
+    X[:, :N_BASE] = df[BASE_FEATURES].to_numpy(dtype=float)
+    X[:, RISK_COUNT] = df['risk_count'].to_numpy(dtype=float)
+    X[:, PERMIT_COUNT] = df['permit_count'].to_numpy(dtype=float)
+    return engineer(X)
+
+
+def synthetic_bids(n, seed=0):
+    # Plausible request dicts for warm-up and benchmarks
+    rng = np.random.default_rng(seed)
+    bid_total = rng.uniform(30000, 1500000, n)
+    shares = rng.dirichlet([4, 3.5, 1.3, 1], n) * 0.95
+    return [
+        {
+            'bid_total': float(bid_total[i]),
+            'materials_cost': float(bid_total[i] * shares[i, 0]),
+            'labor_cost': float(bid_total[i] * shares[i, 1]),
+            'equipment_cost': float(bid_total[i] * shares[i, 2]),
+            'overhead_cost': float(bid_total[i] * shares[i, 3]),
+            'timeline_days': int(rng.integers(20, 450)),
+            'profit_margin': float(rng.uniform(5, 40)),
+            'roi': float(rng.uniform(8, 48)),
+            'contingency': float(rng.uniform(0, 50)),
+            'risk_count': int(rng.integers(0, 6)),
+            'permit_count': int(rng.integers(0, 4)),
+        }
+        for i in range(n)
+    ]
@@ -0,0 +1,364 @@
+import mmap
+import warnings
+
+import numpy as np
+from scipy.special import expit
+from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier, VotingClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.tree import DecisionTreeClassifier
+
+# Array-based inference for the fitted artifacts in model.pkl and
+# model_advanced_bundle.pkl. At load time every tree of the model is
+# flattened into one set of contiguous node arrays; prediction then walks
+# all trees for all rows at once, one vectorized step per tree level, with
+# none of sklearn's per-call validation and per-estimator dispatch.
+#
+# Supported: binary RandomForestClassifier / DecisionTreeClassifier,
+# GradientBoostingClassifier, LogisticRegression (alone or behind
+# StandardScaler steps in a Pipeline, which are folded into its
+# coefficients) and soft VotingClassifier over those. compile_model()
+# returns anything else unchanged, so callers can always use predict /
+# predict_proba / classes_ on the result.
+#
+# The node arrays are kept compact: float32 thresholds (rounded down, see
+# _float32_floor), the smallest unsigned type for feature indices and int32
+# child / root offsets. header() and from_arrays() split a compiled model
+# into those arrays plus a small JSON-able header, which bundle.save_arrays
+# writes as a directory of .npy files that servers memory-map.
+
+ARRAY_NAMES = ('feature', 'threshold', 'children', 'value', 'roots')
+
+
+def _float32_floor(values):
+    # Largest float32 <= each value. Inputs are compared as float32, and no
+    # float32 lies between a float64 threshold and this one, so every split
+    # goes the same way as against sklearn's float64 thresholds
+    rounded = values.astype(np.float32)
+    over = rounded > values
+    rounded[over] = np.nextafter(rounded[over], np.float32(-np.inf))
+    return rounded
+
+
+class CompiledModel:
+    def __init__(self, classes, n_features):
+        self.classes_ = classes
+        self.n_features_in_ = n_features
+        # Flat node arrays shared by every tree of every component. Leaves
+        # point back at themselves so a fixed number of steps is branch-free.
+        self.feature = np.zeros(0, dtype=np.min_scalar_type(max(n_features - 1, 0)))
+        self.threshold = np.zeros(0, dtype=np.float32)
+        self.children = np.zeros(0, dtype=np.int32)  # [2*i] right, [2*i+1] left
+        self.value = np.zeros(0)
+        self.roots = np.zeros(0, dtype=np.int32)
+        self.depth = 0
+        # (kind, weight, params) per voting component
+        self.components = []
+        # Set once the node arrays live in shared memory or a mapped file
+        self.shared = None
+
+    def _add_trees(self, trees, leaf_value):
+        offset = len(self.feature)
+        start = len(self.roots)
+        feature, threshold, children, value, roots = [], [], [], [], []
+        for tree in trees:
+            n = tree.node_count
+            nodes = np.arange(n) + offset
+            leaf = tree.children_left == -1
+            left = np.where(leaf, nodes, tree.children_left + offset)
+            right = np.where(leaf, nodes, tree.children_right + offset)
+            feature.append(np.where(leaf, 0, tree.feature))
+            threshold.append(np.where(leaf, 0.0, tree.threshold))
+            children.append(np.column_stack([right, left]).ravel())
+            value.append(leaf_value(tree))
+            roots.append(offset)
+            self.depth = max(self.depth, tree.max_depth)
+            offset += n
+        if 2 * offset >= 2 ** 31:
+            raise TypeError("Too many tree nodes for int32 offsets")
+        self.feature = np.concatenate([self.feature] + feature).astype(self.feature.dtype)
+        self.threshold = _float32_floor(np.concatenate([self.threshold] + threshold))
+        self.children = np.concatenate([self.children] + children).astype(np.int32)
+        self.value = np.concatenate([self.value] + value)
+        self.roots = np.concatenate([self.roots, roots]).astype(np.int32)
+        return slice(start, len(self.roots))
+
+    def add_forest(self, forest, weight=1.0):
+        trees = [est.tree_ for est in getattr(forest, 'estimators_', [forest])]
+
+        # Leaf value is the class-1 share of the leaf, as in tree.predict_proba
+        def leaf_value(tree):
+            counts = tree.value[:, 0, :]
+            return counts[:, 1] / counts.sum(axis=1)
+
+        self.components.append(('forest', weight, self._add_trees(trees, leaf_value)))
+
+    def add_boosting(self, gb, weight=1.0):
+        trees = [est.tree_ for est in gb.estimators_[:, 0]]
+        trees_slice = self._add_trees(trees, lambda tree: tree.value[:, 0, 0])
+        # The initial raw score is recovered from the public decision_function
+        # so that any init estimator is honoured
+        x0 = np.zeros((1, self.n_features_in_))
+        stages = self.value[self.apply(x0)[:, trees_slice]].sum(axis=1)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            raw0 = float(gb.decision_function(x0)[0] - gb.learning_rate * stages[0])
+        self.components.append(('boosting', weight, (trees_slice, gb.learning_rate, raw0)))
+
+    def add_linear(self, coef, intercept, weight=1.0, center=None):
+        # center: the input the coefficients are explained relative to (the
+        # training mean when a StandardScaler was folded in, else zero)
+        coef = np.ascontiguousarray(coef, dtype=float)
+        center = np.zeros_like(coef) if center is None else np.ascontiguousarray(center, dtype=float)
+        self.components.append(('linear', weight, (coef, float(intercept), center)))
+
+    def header(self):
+        # Everything but the node arrays, as JSON-able values
+        components = []
+        for kind, weight, params in self.components:
+            if kind == 'forest':
+                component = {'trees': [params.start, params.stop]}
+            elif kind == 'boosting':
+                trees_slice, learning_rate, raw0 = params
+                component = {'trees': [trees_slice.start, trees_slice.stop],
+                             'learning_rate': float(learning_rate), 'raw0': raw0}
+            else:
+                coef, intercept, center = params
+                component = {'coef': coef.tolist(), 'intercept': intercept, 'center': center.tolist()}
+            components.append({'kind': kind, 'weight': float(weight), **component})
+        return {
+            'classes': self.classes_.tolist(),
+            'n_features': int(self.n_features_in_),
+            'depth': int(self.depth),
+            'components': components,
+        }
+
+    @classmethod
+    def from_arrays(cls, header, arrays):
+        # Inverse of header(); arrays maps ARRAY_NAMES to arrays used as they
+        # are (e.g. read-only memory maps), without copying
+        model = cls(np.asarray(header['classes']), header['n_features'])
+        model.depth = header['depth']
+        for name in ARRAY_NAMES:
+            setattr(model, name, arrays[name])
+        for component in header['components']:
+            kind, weight = component['kind'], component['weight']
+            if kind == 'forest':
+                params = slice(*component['trees'])
+            elif kind == 'boosting':
+                params = (slice(*component['trees']), component['learning_rate'], component['raw0'])
+            elif kind == 'linear':
+                coef = np.asarray(component['coef'], dtype=float)
+                center = np.asarray(component.get('center', np.zeros_like(coef)), dtype=float)
+                params = (coef, float(component['intercept']), center)
+            else:
+                raise ValueError(f"Unknown model component {kind!r}")
+            model.components.append((kind, weight, params))
+        return model
+
+    def share(self):
+        # Move the node arrays into one read-only anonymous shared mapping,
+        # so processes forked afterwards read the same physical pages.
+        # Arrays mapped from a file are shared through the page cache already.
+        if self.shared is not None:
+            return self
+        sizes = [-(-getattr(self, name).nbytes // 64) * 64 for name in ARRAY_NAMES]
+        buffer = mmap.mmap(-1, max(sum(sizes), 1))
+        offset = 0
+        for name, size in zip(ARRAY_NAMES, sizes):
+            array = getattr(self, name)
+            view = np.frombuffer(buffer, dtype=array.dtype, count=array.size, offset=offset)
+            view[:] = array
+            view.flags.writeable = False
+            setattr(self, name, view)
+            offset += size
+        self.shared = buffer
+        return self
+
+    def apply(self, X):
+        # Leaf index reached in every tree, shape (n_samples, n_trees).
+        # Trees compare float32 inputs, exactly like sklearn's tree code.
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        flat = X.ravel()
+        row_start = (np.arange(len(X)) * X.shape[1])[:, None]
+        nodes = np.broadcast_to(self.roots, (len(X), len(self.roots)))
+        for _ in range(self.depth):
+            go_left = flat[row_start + self.feature[nodes]] <= self.threshold[nodes]
+            nodes = self.children[2 * nodes + go_left]
+        return nodes
+
+    def positive_proba(self, X):
+        X = np.asarray(X, dtype=float)
+        values = self.value[self.apply(X)] if len(self.roots) else None
+        total = np.zeros(len(X))
+        weights = 0.0
+        for kind, weight, params in self.components:
+            if kind == 'forest':
+                p = values[:, params].mean(axis=1)
+            elif kind == 'boosting':
+                trees_slice, learning_rate, raw0 = params
+                p = expit(raw0 + learning_rate * values[:, trees_slice].sum(axis=1))
+            else:
+                coef, intercept, _ = params
+                p = expit(X @ coef + intercept)
+            total += weight * p
+            weights += weight
+        return total / weights
+
+    def _tree_components(self):
+        # Component index of every tree and the factor its node values are
+        # scaled by in that component's output (1/n_trees for a forest's
+        # mean, the learning rate for boosting stages)
+        if not hasattr(self, '_tree_index'):
+            component = np.zeros(len(self.roots), dtype=np.intp)
+            scale = np.zeros(len(self.roots))
+            for k, (kind, _, params) in enumerate(self.components):
+                if kind == 'forest':
+                    component[params] = k
+                    scale[params] = 1.0 / (params.stop - params.start)
+                elif kind == 'boosting':
+                    component[params[0]] = k
+                    scale[params[0]] = params[1]
+            self._tree_index = (component, scale)
+        return self._tree_index
+
+    def explain(self, X):
+        # Per-feature contributions to positive_proba, such that
+        #   base + contributions.sum(axis=1) == positive_proba(X)
+        # Trees use path contributions: walking a row down a tree, each step
+        # moves the node value from parent to child and that change is
+        # credited to the parent's split feature. Every node's value is in
+        # self.value already, so this is the apply() walk plus one bincount
+        # per level. The linear part contributes coef * (x - center).
+        # Boosting and linear parts add up in log-odds; their contributions
+        # are rescaled by (p - p_base) / (raw - raw_base) so they add up in
+        # probability, as the soft vote does.
+        X = np.asarray(X, dtype=float)
+        n, m = X.shape
+        n_components = len(self.components)
+        raw = np.zeros((n, n_components, m))
+        if len(self.roots):
+            tree_component, tree_scale = self._tree_components()
+            flat = np.ascontiguousarray(X, dtype=np.float32).ravel()
+            row_start = (np.arange(n) * m)[:, None]
+            slot = np.arange(n)[:, None] * (n_components * m) + tree_component * m
+            nodes = np.broadcast_to(self.roots, (n, len(self.roots)))
+            for _ in range(self.depth):
+                feature = self.feature[nodes]
+                go_left = flat[row_start + feature] <= self.threshold[nodes]
+                children = self.children[2 * nodes + go_left]
+                delta = (self.value[children] - self.value[nodes]) * tree_scale
+                raw += np.bincount((slot + feature).ravel(), weights=delta.ravel(),
+                                   minlength=n * n_components * m).reshape(n, n_components, m)
+                nodes = children
+            root_value = self.value[self.roots]
+
+        base = np.zeros(n)
+        contributions = np.zeros((n, m))
+        weights = 0.0
+        for k, (kind, weight, params) in enumerate(self.components):
+            if kind == 'forest':
+                p_base = np.full(n, root_value[params].mean())
+                part = raw[:, k]
+            else:
+                if kind == 'boosting':
+                    trees_slice, learning_rate, raw0 = params
+                    raw_base = raw0 + learning_rate * root_value[trees_slice].sum()
+                    part = raw[:, k]
+                else:
+                    coef, intercept, center = params
+                    raw_base = intercept + coef @ center
+                    part = (X - center) * coef
+                shift = part.sum(axis=1)
+                p_base = np.full(n, expit(raw_base))
+                p = expit(raw_base + shift)
+                # Slope of the sigmoid where the shift is too small to divide by
+                flat_shift = np.abs(shift) < 1e-12
+                scale = np.where(flat_shift, p_base * (1 - p_base), (p - p_base) / np.where(flat_shift, 1.0, shift))
+                part = part * scale[:, None]
+            base += weight * p_base
+            contributions += weight * part
+            weights += weight
+        return base / weights, contributions / weights
+
+    def predict_proba(self, X):
+        p = self.positive_proba(X)
+        return np.column_stack([1.0 - p, p])
+
+    def predict(self, X):
+        return self.classes_[(self.positive_proba(X) > 0.5).astype(np.intp)]
+
+
+def _add_component(compiled, est, weight=1.0):
+    if isinstance(est, (RandomForestClassifier, DecisionTreeClassifier)):
+        compiled.add_forest(est, weight)
+    elif isinstance(est, GradientBoostingClassifier) and est.estimators_.shape[1] == 1:
+        compiled.add_boosting(est, weight)
+    elif isinstance(est, LogisticRegression) and est.coef_.shape[0] == 1:
+        compiled.add_linear(est.coef_[0], est.intercept_[0], weight)
+    elif isinstance(est, Pipeline):
+        coef, intercept, center = _fold_scalers(est)
+        compiled.add_linear(coef, intercept, weight, center)
+    else:
+        raise TypeError(f"Unsupported estimator: {type(est).__name__}")
+
+
+def _fold_scalers(pipeline):
+    # StandardScaler steps followed by a LogisticRegression, as one set of
+    # coefficients on the unscaled inputs:
+    #   coef . (x - mean) / scale + b  ==  (coef / scale) . x + (b - (coef / scale) . mean)
+    *steps, (_, lr) = pipeline.steps
+    if not (isinstance(lr, LogisticRegression) and lr.coef_.shape[0] == 1):
+        raise TypeError("Only pipelines ending in a binary LogisticRegression are compiled")
+    coef = np.asarray(lr.coef_[0], dtype=float)
+    intercept = float(lr.intercept_[0])
+    # The unscaled input that the scalers map to zero, e.g. the training mean
+    center = np.zeros_like(coef)
+    for _, step in reversed(steps):
+        if not isinstance(step, StandardScaler):
+            raise TypeError(f"Unsupported pipeline step: {type(step).__name__}")
+        scaler = CompiledScaler(step)
+        coef = coef / scaler.scale_
+        intercept -= float(np.sum(coef * scaler.mean_))
+        center = center * scaler.scale_ + scaler.mean_
+    return coef, intercept, center
+
+
+def compile_model(model):
+    # Compile a fitted binary classifier, or return it unchanged if it is
+    # not one of the supported types
+    if isinstance(model, CompiledModel):
+        return model
+    try:
+        if len(model.classes_) != 2:
+            raise TypeError("Only binary classifiers are compiled")
+        compiled = CompiledModel(model.classes_, model.n_features_in_)
+        if isinstance(model, VotingClassifier):
+            if model.voting != 'soft':
+                raise TypeError("Only soft voting is compiled")
+            # estimators_ leaves out members set to 'drop'; so must the weights
+            weights = ([w for (_, est), w in zip(model.estimators, model.weights) if est != 'drop']
+                       if model.weights is not None else [1.0] * len(model.estimators_))
+            for est, weight in zip(model.estimators_, weights):
+                _add_component(compiled, est, float(weight))
+        else:
+            _add_component(compiled, model)
+        return compiled
+    except (TypeError, AttributeError):
+        return model
+
+
+class CompiledScaler:
+    def __init__(self, scaler):
+        self.mean_ = scaler.mean_ if scaler.with_mean else 0.0
+        self.scale_ = scaler.scale_ if scaler.with_std else 1.0
+
+    def transform(self, X):
+        return (np.asarray(X, dtype=float) - self.mean_) / self.scale_
+
+
+def compile_scaler(scaler):
+    if isinstance(scaler, StandardScaler):
+        return CompiledScaler(scaler)
+    return scaler
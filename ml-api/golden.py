@@ -0,0 +1,170 @@
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from features import BASE_FEATURES, COUNT_FEATURES, prepare_export
+
+# Golden-prediction snapshots. A snapshot holds the reference bids (the
+# test_model.py / test_model_advanced.py cases and a fixed random slice of
+# bids.csv) as feature columns, with the class-1 probability a model
+# version gave each of them. Diffing another bundle against it featurizes
+# the columns and scores them in one matrix call, then reports label flips
+# and probability deltas above a tolerance: a few milliseconds, cheap
+# enough for the hot-reload validation path.
+#
+# GOLDEN_DIR         snapshots directory; when set, a hot reload of model
+#                    NAME is rejected if it fails the gate against
+#                    GOLDEN_DIR/NAME.json (no snapshot: no gate)
+# GOLDEN_TOLERANCE   probability delta that counts as a change (default 0.05)
+# GOLDEN_MAX_FLIPS   label flips allowed (default 0)
+# GOLDEN_MAX_CHANGED rows over the tolerance allowed (default 0)
+#
+# To run: python golden.py record model_advanced.arrays golden/advanced.json
+#         python golden.py diff model_advanced.arrays golden/advanced.json
+
+FORMAT = "nirman-golden/1"
+FIELDS = BASE_FEATURES + COUNT_FEATURES
+SAMPLE_ROWS = 256
+TOLERANCE = float(os.environ.get("GOLDEN_TOLERANCE", 0.05))
+MAX_FLIPS = int(os.environ.get("GOLDEN_MAX_FLIPS", 0))
+MAX_CHANGED = int(os.environ.get("GOLDEN_MAX_CHANGED", 0))
+
+
+def reference_rows(csv_path="bids.csv", sample_rows=SAMPLE_ROWS, seed=0):
+    # (names, {field: column}) of the test cases and a slice of the export
+    import test_model
+    import test_model_advanced
+
+    cases = test_model.test_cases + test_model_advanced.test_cases
+    names = [f"case: {case['name']}" for case in cases]
+    rows = [case["features"] for case in cases]
+    if csv_path and os.path.exists(csv_path):
+        df = prepare_export(pd.read_csv(csv_path))
+        sample = df.sample(min(sample_rows, len(df)), random_state=seed)
+        names += [f"bids.csv row {i}" for i in sample.index]
+        rows += sample[FIELDS].to_dict("records")
+    columns = {name: [float(row.get(name, 0)) for row in rows] for name in FIELDS}
+    return names, columns
+
+
+def positive_proba(bundle, columns):
+    n_rows = len(next(iter(columns.values())))
+    X, _, errors = bundle.schema.column_matrix({k: np.asarray(v, dtype=float) for k, v in columns.items()}, n_rows)
+    if errors:
+        raise ValueError(f"Golden rows could not be featurized: {errors}")
+    return bundle.predict_proba(X)[:, 1]
+
+
+def record(bundle, path, names=None, columns=None):
+    if columns is None:
+        names, columns = reference_rows()
+    snapshot = {
+        "format": FORMAT,
+        "version": bundle.version,
+        "features": bundle.features,
+        "names": names,
+        "columns": columns,
+        "probabilities": positive_proba(bundle, columns).tolist(),
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(snapshot, f)
+    return snapshot
+
+
+def load(path):
+    with open(path) as f:
+        snapshot = json.load(f)
+    if snapshot.get("format") != FORMAT:
+        raise ValueError(f"{path} is not a {FORMAT} snapshot")
+    return snapshot
+
+
+def diff(bundle, snapshot, tolerance=TOLERANCE, worst=10):
+    if snapshot["features"] != bundle.features:
+        raise ValueError("Golden snapshot was recorded for a different feature order")
+    before = np.asarray(snapshot["probabilities"])
+    after = positive_proba(bundle, snapshot["columns"])
+    delta = after - before
+    flipped = (before > 0.5) != (after > 0.5)
+    changed = np.abs(delta) > tolerance
+    order = np.argsort(-np.abs(delta))[:worst]
+    return {
+        "baseline_version": snapshot["version"],
+        "version": bundle.version,
+        "rows": len(before),
+        "tolerance": tolerance,
+        "flips": int(flipped.sum()),
+        "changed": int(changed.sum()),
+        "max_abs_delta": float(np.abs(delta).max(initial=0.0)),
+        "mean_abs_delta": float(np.abs(delta).mean()) if len(delta) else 0.0,
+        "worst": [
+            {"name": snapshot["names"][i], "before": float(before[i]), "after": float(after[i]),
+             "flipped": bool(flipped[i])}
+            for i in order if changed[i] or flipped[i]
+        ],
+    }
+
+
+def passes(report, max_flips=MAX_FLIPS, max_changed=MAX_CHANGED):
+    return report["flips"] <= max_flips and report["changed"] <= max_changed
+
+
+def gate(name, bundle):
+    # Hot-reload check of a candidate for model `name`; returns the report
+    # (None without a snapshot) and raises ValueError when it fails
+    directory = os.environ.get("GOLDEN_DIR")
+    path = os.path.join(directory, f"{name}.json") if directory else None
+    if path is None or not os.path.exists(path):
+        return None
+    report = diff(bundle, load(path))
+    if not passes(report):
+        raise ValueError(
+            f"Golden check failed against {report['baseline_version']}: {report['flips']} flips, "
+            f"{report['changed']} of {report['rows']} rows changed by more than {report['tolerance']:g}"
+        )
+    return report
+
+
+def print_report(report):
+    print(f"{report['baseline_version']} -> {report['version']}: {report['rows']} rows, "
+          f"{report['flips']} flips, {report['changed']} changed by more than {report['tolerance']:g}, "
+          f"max |delta| {report['max_abs_delta']:.4f}, mean |delta| {report['mean_abs_delta']:.4f}")
+    for row in report["worst"]:
+        print(f"  {'FLIP ' if row['flipped'] else '     '}{row['before']:.4f} -> {row['after']:.4f}  {row['name']}")
+
+
+def main():
+    from bundle import ModelBundle
+
+    parser = argparse.ArgumentParser(description="Golden-prediction snapshots of a model")
+    parser.add_argument("command", choices=["record", "diff"])
+    parser.add_argument("model", help="model directory or pickle")
+    parser.add_argument("snapshot", help="snapshot JSON file")
+    parser.add_argument("--scaler")
+    parser.add_argument("--csv", default="bids.csv")
+    parser.add_argument("--sample-rows", type=int, default=SAMPLE_ROWS)
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--max-flips", type=int, default=MAX_FLIPS)
+    parser.add_argument("--max-changed", type=int, default=MAX_CHANGED)
+    args = parser.parse_args()
+
+    bundle = ModelBundle.load(args.model, args.scaler, model_dir=".")
+    if args.command == "record":
+        names, columns = reference_rows(args.csv, args.sample_rows)
+        snapshot = record(bundle, args.snapshot, names, columns)
+        print(f"Recorded {len(snapshot['names'])} rows of model {bundle.version} to {args.snapshot}")
+        return
+    report = diff(bundle, load(args.snapshot), args.tolerance)
+    print_report(report)
+    ok = passes(report, args.max_flips, args.max_changed)
+    print("PASS" if ok else "FAIL")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+import argparse
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import requests
+
+import test_model
+import test_model_advanced
+
+# Load generator for a running ML API, using the test_cases of
+# test_model.py / test_model_advanced.py as the payload corpus. Each
+# client thread keeps one pooled keep-alive requests.Session.
+#
+#   closed loop (default)  every client sends its next request as soon as
+#                          the previous one answers
+#   --rate R               open loop: R requests/s in total on a fixed
+#                          schedule; latency is measured from the scheduled
+#                          send time, so a stalled server is not hidden by
+#                          clients sending less (coordinated omission)
+#
+# Reports throughput, p50/p95/p99/max latency of successful requests, error
+# counts by status or exception, and a per-interval series, printed and
+# written as JSON with --output. --compare prints the change against an
+# earlier JSON report. Requests during --warmup seconds are not counted.
+# To run: python load_test.py --concurrency 16 --duration 10 --output run.json
+#         python load_test.py --rate 500 --duration 10 --compare run.json
+
+SUITES = {"basic": test_model.test_cases, "advanced": test_model_advanced.test_cases}
+
+
+def corpus(suite):
+    cases = SUITES["basic"] + SUITES["advanced"] if suite == "all" else SUITES[suite]
+    return [json.dumps({"features": case["features"]}).encode() for case in cases]
+
+
+def percentiles(latencies):
+    if not len(latencies):
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None}
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    return {"p50_ms": p50, "p95_ms": p95, "p99_ms": p99, "max_ms": float(np.max(latencies)) * 1000}
+
+
+class LoadTest:
+    def __init__(self, url, bodies, concurrency, duration, rate=None, warmup=1.0, timeout=10.0, headers=None):
+        self.url = url
+        self.bodies = bodies
+        self.concurrency = concurrency
+        self.duration = duration
+        self.rate = rate
+        self.warmup = warmup
+        self.timeout = timeout
+        self.headers = {"Content-Type": "application/json", **(headers or {})}
+        self.tickets = itertools.count()
+        # One list per client: (send offset s, latency s, status or exception name)
+        self.samples = [[] for _ in range(concurrency)]
+
+    def client(self, i, start):
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=1)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        end = start + self.warmup + self.duration
+        samples = self.samples[i]
+        while True:
+            ticket = next(self.tickets)
+            if self.rate:
+                scheduled = start + ticket / self.rate
+                if scheduled >= end:
+                    break
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            else:
+                scheduled = time.perf_counter()
+                if scheduled >= end:
+                    break
+            try:
+                response = session.post(self.url, data=self.bodies[ticket % len(self.bodies)],
+                                        headers=self.headers, timeout=self.timeout)
+                outcome = response.status_code
+            except requests.RequestException as e:
+                outcome = type(e).__name__
+            samples.append((scheduled - start - self.warmup, time.perf_counter() - scheduled, outcome))
+        session.close()
+
+    def run(self, interval=1.0):
+        start = time.perf_counter()
+        threads = [threading.Thread(target=self.client, args=(i, start)) for i in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.report(interval)
+
+    def report(self, interval):
+        samples = sorted(s for samples in self.samples for s in samples if s[0] >= 0)
+        offsets = np.array([s[0] for s in samples])
+        latencies = np.array([s[1] for s in samples])
+        ok = np.array([s[2] == 200 for s in samples], dtype=bool)
+        errors = {}
+        for _, _, outcome in samples:
+            if outcome != 200:
+                errors[str(outcome)] = errors.get(str(outcome), 0) + 1
+        series = []
+        buckets = (offsets // interval).astype(int) if len(samples) else np.array([], dtype=int)
+        for bucket in range(int(np.ceil(self.duration / interval))):
+            mask = buckets == bucket
+            series.append({
+                "t": bucket * interval,
+                "requests": int(mask.sum()),
+                "ok_per_s": float((mask & ok).sum() / interval),
+                "errors": int((mask & ~ok).sum()),
+                **percentiles(latencies[mask & ok]),
+            })
+        return {
+            "url": self.url,
+            "mode": f"open loop {self.rate:g} req/s" if self.rate else "closed loop",
+            "concurrency": self.concurrency,
+            "duration_s": self.duration,
+            "requests": len(samples),
+            "ok": int(ok.sum()),
+            "throughput_per_s": float(ok.sum() / self.duration),
+            "error_rate": float((~ok).sum() / len(samples)) if len(samples) else 0.0,
+            "errors": errors,
+            **percentiles(latencies[ok]),
+            "series": series,
+        }
+
+
+def print_report(report, baseline=None):
+    print(f"{report['url']}, {report['mode']}, {report['concurrency']} clients x {report['duration_s']:g} s")
+    keys = ["throughput_per_s", "error_rate", "p50_ms", "p95_ms", "p99_ms", "max_ms"]
+    for key in keys:
+        value = report[key]
+        line = f"  {key:17s} {'-' if value is None else f'{value:10.3f}':>10s}"
+        before = baseline.get(key) if baseline else None
+        if value is not None and before:
+            line += f"   was {before:10.3f}  ({(value - before) / before:+.1%})"
+        print(line)
+    if report["errors"]:
+        print("  errors: " + ", ".join(f"{outcome} x{count}" for outcome, count in sorted(report["errors"].items())))
+    print(f"  {'t':>5s} {'ok/s':>8s} {'errors':>6s} {'p50_ms':>8s} {'p99_ms':>8s}")
+    for point in report["series"]:
+        p50 = "-" if point["p50_ms"] is None else f"{point['p50_ms']:8.2f}"
+        p99 = "-" if point["p99_ms"] is None else f"{point['p99_ms']:8.2f}"
+        print(f"  {point['t']:5.1f} {point['ok_per_s']:8.1f} {point['errors']:6d} {p50:>8s} {p99:>8s}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent load test of the ML API")
+    parser.add_argument("--url", default="http://localhost:8000/predict")
+    parser.add_argument("--suite", choices=["basic", "advanced", "all"], default="advanced")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rate", type=float, help="total requests/s (open loop); default: closed loop")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--warmup", type=float, default=1)
+    parser.add_argument("--interval", type=float, default=1, help="seconds per point of the series")
+    parser.add_argument("--timeout", type=float, default=10)
+    parser.add_argument("--deadline-ms", type=float, help="sent as X-Deadline-Ms")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--compare", help="earlier JSON report to compare against")
+    args = parser.parse_args()
+
+    headers = {"X-Deadline-Ms": f"{args.deadline_ms:g}"} if args.deadline_ms else None
+    test = LoadTest(args.url, corpus(args.suite), args.concurrency, args.duration,
+                    args.rate, args.warmup, args.timeout, headers)
+    report = test.run(args.interval)
+    baseline = None
+    if args.compare and os.path.exists(args.compare):
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if not report["ok"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,38 +1,117 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
-import joblib
-import numpy as np
+import asyncio
+import os
+import time
 import uvicorn
 
-app = FastAPI()
+from admission import AdmissionController, add_middleware
+from cache import PredictionCache
+import columnar
+from executor import InferenceExecutor
+import metrics
+from registry import ModelRegistry
+from schema import FastJSONResponse, SchemaError, error_response, parse_features, query_flag
+from startup import Startup
+import streaming
+import sweep
 
-# Load model (no encoder needed for bid-only features)
-model = joblib.load("model.pkl")
+startup = Startup("main")
+
+# Scoring runs on a worker pool, off the event loop
+executor = InferenceExecutor()
+
+# Model (no encoder needed for bid-only features), memory-mapped at startup
+# from the compiled node arrays train_model.py exports next to model.pkl
+# (the pickle itself still loads, via MODEL_REGISTRY, and is compiled on
+# load). Concurrent /predict requests are coalesced into one matrix call.
+registry = ModelRegistry.from_env(
+    {"basic": {"model": "model.arrays", "weight": 1}},
+    executor,
+    max_batch_size=int(os.environ.get("BATCH_MAX_SIZE", 64)),
+    max_wait=float(os.environ.get("BATCH_MAX_WAIT_MS", 2)) / 1000,
+)
+
+# Repeated bids are answered from cache, keyed on the rounded feature vector
+cache = PredictionCache(
+    max_size=int(os.environ.get("PREDICTION_CACHE_SIZE", 4096)),
+    ttl=float(os.environ.get("PREDICTION_CACHE_TTL", 300)),
+)
+
+async def boot():
+    bundles = await startup.run(registry.load_all, registry.warm_up_all)
+    if bundles is not None:
+        registry.install(bundles)
+
+@asynccontextmanager
+async def lifespan(app):
+    task = asyncio.create_task(boot())
+    yield
+    task.cancel()
+    registry.stop()
+    executor.shutdown()
+
+# Bounded queue and deadlines in front of the scoring routes; requests that
+# cannot be served in time are shed with 429 / 503 instead of piling up
+admission = AdmissionController()
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+add_middleware(app, startup.name, admission)
+startup.add_routes(app)
+registry.add_routes(app)
+# Per-stage latency histograms, outcomes and gauges in Prometheus format
+metrics.add_routes(app, startup.name, executor, cache, registry)
+# Bulk CSV / NDJSON scoring, streamed back as NDJSON
+streaming.add_routes(app, startup.name, registry, executor)
+# Win probability over a grid of one or two bid fields
+sweep.add_routes(app, startup.name, registry, executor)
+# Packed binary feature columns in, prediction / probability columns out
+columnar.add_routes(app, startup.name, registry, executor)
 
 @app.post("/predict")
 async def predict(request: Request):
-    data = await request.json()
-    # Expecting data to have bid features only
-    try:
-        features = data["features"]
-        # Build feature vector in the correct order (bid-only features)
-        feature_vector = [
-            features["bid_total"],
-            features["materials_cost"],
-            features["labor_cost"],
-            features["equipment_cost"],
-            features["overhead_cost"],
-            features["timeline_days"],
-            features["profit_margin"],
-            features["roi"],
-            features["contingency"]
-        ]
-        X = np.array(feature_vector).reshape(1, -1)
-        prediction = int(model.predict(X)[0])
-        probability = float(model.predict_proba(X).max())
-        return {"prediction": prediction, "probability": probability}
-    except Exception as e:
-        return {"error": str(e)}
+    with metrics.track(startup.name, "predict") as tracked:
+        start = time.perf_counter()
+        if not registry.ready:
+            tracked.outcome = "not_ready"
+            return FastJSONResponse({"error": "model not ready"}, status_code=503)
+        entry = registry.route(request.headers)
+        bundle = entry.current
+        tracked.model = entry.name
+        # Expecting data to have bid features only
+        try:
+            with metrics.PARSE.time():
+                row = parse_features(await request.body())
+            # Build feature vector in the correct order (bid-only features)
+            x = bundle.featurize(row)
+        except SchemaError as e:
+            tracked.outcome = "invalid"
+            return error_response(e)
+        try:
+            if query_flag(request, "explain"):
+                # Explained results are cached and batched apart from plain ones
+                key = cache.key((bundle.version, "explain"), x)
+                result = await cache.get_or_compute(key, lambda: entry.explain_batcher.submit((bundle, x)))
+            else:
+                key = cache.key(bundle.version, x)
+                result = await cache.get_or_compute(key, lambda: entry.batcher.submit((bundle, x)))
+        except Exception as e:
+            tracked.outcome = "error"
+            return FastJSONResponse({"error": str(e)}, status_code=500)
+        entry.latency.record(time.perf_counter() - start)
+        registry.shadow_score(entry, row, result)
+        startup.first_request(time.perf_counter() - start)
+        return FastJSONResponse({**result, "model": entry.name})
+
+@app.get("/stats")
+async def stats():
+    return {
+        "executor": executor.stats(),
+        "admission": admission.stats(),
+        "cache": cache.stats(),
+        **registry.stats(),
+    }
 
 # Uncomment below to run directly with: python main.py
 # if __name__ == "__main__":
-#     uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+#     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -1,55 +1,147 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
-import joblib
-import numpy as np
-import pandas as pd
-
-app = FastAPI()
-
-# Load the advanced model and scaler
-model = joblib.load("model_advanced.pkl")
-scaler = joblib.load("scaler.pkl")
-
-# The features must match the order in your training script
-features = [
-    'bid_total', 'materials_cost', 'labor_cost', 'equipment_cost', 'overhead_cost',
-    'timeline_days', 'profit_margin', 'roi', 'contingency',
-    'materials_ratio', 'labor_ratio', 'equipment_ratio', 'overhead_ratio',
-    'cost_per_day', 'profit_per_day', 'high_risk', 'low_margin',
-    'risk_count', 'permit_count'
-]
-
-def engineer_features(data):
-    # Calculate engineered features from input
-    df = pd.DataFrame([data])
-    # Ratios
-    df['materials_ratio'] = df['materials_cost'] / df['bid_total']
-    df['labor_ratio'] = df['labor_cost'] / df['bid_total']
-    df['equipment_ratio'] = df['equipment_cost'] / df['bid_total']
-    df['overhead_ratio'] = df['overhead_cost'] / df['bid_total']
-    # Efficiency
-    df['cost_per_day'] = df['bid_total'] / (df['timeline_days'] if df['timeline_days'].iloc[0] != 0 else 1)
-    df['profit_per_day'] = (df['bid_total'] * df['profit_margin'] / 100) / (df['timeline_days'] if df['timeline_days'].iloc[0] != 0 else 1)
-    # Risk indicators
-    df['high_risk'] = int(df['contingency'].iloc[0] > 15 or df['timeline_days'].iloc[0] < 0)
-    df['low_margin'] = int(df['profit_margin'].iloc[0] < 10)
-    # Text-based features (optional, set to 0 if not provided)
-    df['risk_count'] = data.get('risk_count', 0)
-    df['permit_count'] = data.get('permit_count', 0)
-    # Fill missing
-    df = df[features].fillna(0)
-    return df
+import asyncio
+import os
+import time
+import warnings
+
+from admission import AdmissionController, add_middleware
+from cache import PredictionCache
+import columnar
+from executor import InferenceExecutor
+import metrics
+import optimizer
+from registry import ModelRegistry
+from schema import FastJSONResponse, SchemaError, error_response, parse_features, query_flag
+from startup import Startup
+import streaming
+import sweep
+
+startup = Startup("main_advanced")
+
+# Requests pass bare ndarrays; the feature order is fixed by features.FEATURES
+warnings.filterwarnings("ignore", message="X does not have valid feature names")
+
+# Scoring runs on a worker pool, off the event loop
+executor = InferenceExecutor()
+
+# Hosted models, loaded from MODEL_DIR at startup. By default only the
+# advanced model's node arrays exported by train_model_advanced.py (feature
+# order, trees and folded scaling, memory-mapped and parity-checked on
+# load); set MODEL_REGISTRY to host several bundles
+# (e.g. the 9-feature model.arrays next to it) and split traffic between them.
+# Concurrent /predict requests for a model are coalesced into one matrix call.
+registry = ModelRegistry.from_env(
+    {"advanced": {"model": "model_advanced.arrays", "weight": 1}},
+    executor,
+    max_batch_size=int(os.environ.get("BATCH_MAX_SIZE", 64)),
+    max_wait=float(os.environ.get("BATCH_MAX_WAIT_MS", 2)) / 1000,
+)
+
+# Repeated bids are answered from cache, keyed on the rounded feature vector
+cache = PredictionCache(
+    max_size=int(os.environ.get("PREDICTION_CACHE_SIZE", 4096)),
+    ttl=float(os.environ.get("PREDICTION_CACHE_TTL", 300)),
+)
+
+async def boot():
+    bundles = await startup.run(registry.load_all, registry.warm_up_all)
+    if bundles is not None:
+        registry.install(bundles)
+
+@asynccontextmanager
+async def lifespan(app):
+    task = asyncio.create_task(boot())
+    yield
+    task.cancel()
+    registry.stop()
+    executor.shutdown()
+
+# Bounded queue and deadlines in front of the scoring routes; requests that
+# cannot be served in time are shed with 429 / 503 instead of piling up
+admission = AdmissionController()
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+add_middleware(app, startup.name, admission)
+startup.add_routes(app)
+registry.add_routes(app)
+# Per-stage latency histograms, outcomes and gauges in Prometheus format
+metrics.add_routes(app, startup.name, executor, cache, registry)
+# Bulk CSV / NDJSON scoring, streamed back as NDJSON
+streaming.add_routes(app, startup.name, registry, executor)
+# Win probability over a grid of one or two bid fields
+sweep.add_routes(app, startup.name, registry, executor)
+# Packed binary feature columns in, prediction / probability columns out
+columnar.add_routes(app, startup.name, registry, executor)
+# Profit margin / bid total maximizing expected profit for a cost breakdown
+optimizer.add_routes(app, startup.name, registry, executor)
+
+def not_ready():
+    return FastJSONResponse({"error": "model not ready"}, status_code=503)
 
 @app.post("/predict")
 async def predict(request: Request):
-    data = await request.json()
-    try:
-        features_dict = data["features"]
-        X = engineer_features(features_dict)
-        X_scaled = scaler.transform(X)
-        prediction = int(model.predict(X_scaled)[0])
-        probability = float(model.predict_proba(X_scaled).max())
-        return {"prediction": prediction, "probability": probability}
-    except Exception as e:
-        return {"error": str(e)}
-
-# To run: python -m uvicorn main_advanced:app --reload --port 8000 
\ No newline at end of file
+    with metrics.track(startup.name, "predict") as tracked:
+        start = time.perf_counter()
+        if not registry.ready:
+            tracked.outcome = "not_ready"
+            return not_ready()
+        # X-Model header or weighted split
+        entry = registry.route(request.headers)
+        bundle = entry.current
+        tracked.model = entry.name
+        try:
+            with metrics.PARSE.time():
+                row = parse_features(await request.body())
+            x = bundle.featurize(row)
+        except SchemaError as e:
+            tracked.outcome = "invalid"
+            return error_response(e)
+        try:
+            if query_flag(request, "explain"):
+                # Explained results are cached and batched apart from plain ones
+                key = cache.key((bundle.version, "explain"), x)
+                result = await cache.get_or_compute(key, lambda: entry.explain_batcher.submit((bundle, x)))
+            else:
+                key = cache.key(bundle.version, x)
+                result = await cache.get_or_compute(key, lambda: entry.batcher.submit((bundle, x)))
+        except Exception as e:
+            tracked.outcome = "error"
+            return FastJSONResponse({"error": str(e)}, status_code=500)
+        entry.latency.record(time.perf_counter() - start)
+        registry.shadow_score(entry, row, result)
+        startup.first_request(time.perf_counter() - start)
+        return FastJSONResponse({**result, "model": entry.name})
+
+@app.post("/predict_batch")
+async def predict_batch(request: Request):
+    with metrics.track(startup.name, "predict_batch") as tracked:
+        if not registry.ready:
+            tracked.outcome = "not_ready"
+            return not_ready()
+        entry = registry.route(request.headers)
+        tracked.model = entry.name
+        try:
+            with metrics.PARSE.time():
+                rows = parse_features(await request.body())
+            if isinstance(rows, list):
+                metrics.BATCH_SIZE.labels(entry.name, "predict_batch").observe(len(rows))
+            results = await executor.run(entry.current.score_rows, rows, query_flag(request, "explain"))
+        except SchemaError as e:
+            tracked.outcome = "invalid"
+            return error_response(e)
+        except Exception as e:
+            tracked.outcome = "error"
+            return FastJSONResponse({"error": str(e)}, status_code=500)
+        return FastJSONResponse({"model": entry.name, "results": results})
+
+@app.get("/stats")
+async def stats():
+    return {
+        "executor": executor.stats(),
+        "admission": admission.stats(),
+        "cache": cache.stats(),
+        **registry.stats(),
+    }
+
+# To run: python -m uvicorn main_advanced:app --reload --port 8000
@@ -0,0 +1,317 @@
+import threading
+from bisect import bisect_left
+from threading import get_ident
+from time import perf_counter
+
+from fastapi.responses import PlainTextResponse
+
+# Prometheus metrics for the ML API, served as text on /metrics.
+#
+# Recording is lock-free on the hot path: every counter and histogram keeps
+# one shard of values per recording thread (the event loop and each
+# inference worker), so a thread only ever writes its own shard and the
+# shards are summed when /metrics is scraped. A lock is taken only the first
+# time a thread or label set is seen. Gauges for executor, cache and batcher
+# state are read from those objects at scrape time, costing nothing per
+# request.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Stage timings are mostly tens of microseconds; requests up to seconds
+LATENCY_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in (*zip(names, values), *extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Sharded:
+    # Per-thread list of values; only the owning thread writes to it
+    def __init__(self, size, lock):
+        self.size = size
+        self.lock = lock
+        self.shards = {}
+
+    def shard(self):
+        ident = get_ident()
+        try:
+            return self.shards[ident]
+        except KeyError:
+            with self.lock:
+                return self.shards.setdefault(ident, [0] * self.size)
+
+    def total(self):
+        totals = [0] * self.size
+        for values in list(self.shards.values()):
+            for i, value in enumerate(values):
+                totals[i] += value
+        return totals
+
+
+class _CounterChild(_Sharded):
+    def __init__(self, lock):
+        super().__init__(1, lock)
+
+    def inc(self, amount=1):
+        self.shard()[0] += amount
+
+
+class _HistogramChild(_Sharded):
+    # Shard layout: one count per bucket, then +Inf, then the sum
+    def __init__(self, buckets, lock):
+        super().__init__(len(buckets) + 2, lock)
+        self.buckets = buckets
+
+    def observe(self, value):
+        try:
+            values = self.shards[get_ident()]
+        except KeyError:
+            values = self.shard()
+        values[bisect_left(self.buckets, value)] += 1
+        values[-1] += value
+
+    def time(self):
+        return _Timer(self)
+
+
+class _Timer:
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(perf_counter() - self.start)
+
+
+class _GaugeChild:
+    # Set from the event loop thread only
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+        self.callbacks = []
+        self.lock = threading.Lock()
+
+    def labels(self, *values):
+        try:
+            return self.children[values]
+        except KeyError:
+            with self.lock:
+                return self.children.setdefault(values, self._child())
+
+    def add_callback(self, callback):
+        # callback() -> {label values: value}, read at scrape time
+        self.callbacks.append(callback)
+
+    def samples(self):
+        for values, child in list(self.children.items()):
+            yield self.name, _labels(self.labelnames, values), self._value(child)
+        for callback in self.callbacks:
+            for values, value in callback().items():
+                yield self.name, _labels(self.labelnames, values), value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines += [f"{name}{labels} {_number(value)}" for name, labels, value in self.samples()]
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _child(self):
+        return _CounterChild(self.lock)
+
+    def _value(self, child):
+        return child.total()[0]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def _child(self):
+        return _GaugeChild()
+
+    def _value(self, child):
+        return child.value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def _child(self):
+        return _HistogramChild(self.buckets, self.lock)
+
+    def samples(self):
+        for values, child in list(self.children.items()):
+            totals = child.total()
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), totals):
+                cumulative += count
+                le = (("le", _number(float(bound))),)
+                yield f"{self.name}_bucket", _labels(self.labelnames, values, le), cumulative
+            labels = _labels(self.labelnames, values)
+            yield f"{self.name}_sum", labels, totals[-1]
+            yield f"{self.name}_count", labels, cumulative
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        # Re-registering a name returns the existing metric, so several apps
+        # in one process (e.g. the in-process test runners) share it
+        with self.lock:
+            return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "ml_stage_duration_seconds", "Time spent in each /predict pipeline stage.", ["stage"],
+)
+REQUESTS = REGISTRY.counter(
+    "ml_requests_total", "Requests by endpoint, model and outcome.", ["app", "endpoint", "model", "outcome"],
+)
+REQUEST_SECONDS = REGISTRY.histogram(
+    "ml_request_duration_seconds", "End-to-end handler latency.", ["app", "endpoint", "model"],
+)
+IN_FLIGHT = REGISTRY.gauge(
+    "ml_requests_in_flight", "Requests currently being handled.", ["app", "endpoint"],
+)
+BATCH_SIZE = REGISTRY.histogram(
+    "ml_batch_size", "Rows per model call.", ["model", "source"], buckets=BATCH_BUCKETS,
+)
+
+# Stage children, resolved once; `with PARSE.time(): ...` or PARSE.observe(s)
+PARSE = STAGE_SECONDS.labels("parse")
+ENGINEER = STAGE_SECONDS.labels("engineer_features")
+SCALER = STAGE_SECONDS.labels("scaler.transform")
+PREDICT = STAGE_SECONDS.labels("predict")
+PREDICT_PROBA = STAGE_SECONDS.labels("predict_proba")
+EXPLAIN = STAGE_SECONDS.labels("explain")
+SERIALIZE = STAGE_SECONDS.labels("serialize")
+
+
+class track:
+    # Counts, times and gauges one request:
+    #   with track("main", "predict") as t:
+    #       t.model = entry.name
+    #       t.outcome = "invalid"
+    # Outcome defaults to "ok"; if the block raises it is "invalid" for
+    # HTTP 4xx exceptions (e.g. an unknown X-Model) and "error" otherwise.
+    def __init__(self, app, endpoint):
+        self.app = app
+        self.endpoint = endpoint
+        self.model = ""
+        self.outcome = "ok"
+
+    def __enter__(self):
+        self.in_flight = IN_FLIGHT.labels(self.app, self.endpoint)
+        self.in_flight.inc()
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = perf_counter() - self.start
+        self.in_flight.dec()
+        if exc_type is not None:
+            self.outcome = "invalid" if getattr(exc, "status_code", 500) < 500 else "error"
+        REQUESTS.labels(self.app, self.endpoint, self.model, self.outcome).inc()
+        REQUEST_SECONDS.labels(self.app, self.endpoint, self.model).observe(elapsed)
+
+
+def add_routes(app, name, executor, cache, registry):
+    # Scrape-time gauges for this app's executor, cache and hosted models,
+    # plus the /metrics route
+    REGISTRY.gauge(
+        "ml_executor_in_flight", "Inference calls submitted and not yet finished.", ["app"],
+    ).add_callback(lambda: {(name,): executor.in_flight})
+    REGISTRY.gauge(
+        "ml_executor_queue_depth", "Inference calls waiting for a worker.", ["app"],
+    ).add_callback(lambda: {(name,): executor.stats()["queue_depth"]})
+    REGISTRY.gauge(
+        "ml_executor_workers", "Inference worker threads.", ["app"],
+    ).add_callback(lambda: {(name,): executor.workers})
+    REGISTRY.gauge(
+        "ml_batcher_pending", "Requests waiting in a model's micro-batcher.", ["app", "model"],
+    ).add_callback(lambda: {
+        (name, entry.name): len(entry.batcher.pending) + len(entry.explain_batcher.pending)
+        for entry in registry.entries.values()
+    })
+    REGISTRY.gauge(
+        "ml_model_info", "Loaded model bundle versions (always 1).", ["app", "model", "version"],
+    ).add_callback(lambda: {
+        (name, entry.name, entry.current.version): 1
+        for entry in registry.entries.values() if entry.current is not None
+    })
+    cache_events = REGISTRY.counter(
+        "ml_cache_events_total", "Prediction cache lookups by result.", ["app", "event"],
+    )
+    cache_events.add_callback(lambda: {
+        (name, event): cache.stats()[event]
+        for event in ("hits", "misses", "coalesced", "evictions", "expirations")
+    })
+    REGISTRY.gauge(
+        "ml_cache_size", "Entries in the prediction cache.", ["app"],
+    ).add_callback(lambda: {(name,): len(cache.entries)})
+
+    @app.get("/metrics")
+    async def metrics():
+        return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
@@ -0,0 +1,186 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import orjson
+from fastapi import Request
+
+import metrics
+from schema import FastJSONResponse, SchemaError, error_response
+
+# Expected-value bid optimizer. For a fixed cost breakdown, the profit
+# margin m (percent of the bid price, as in features.engineer's
+# profit_per_day) sets the price,
+#
+#   bid_total = cost / (1 - m / 100),   profit = bid_total * m / 100
+#
+# and the optimizer finds the m that maximizes P(win) * profit under the
+# model. The other bid fields (timeline_days, roi, contingency, counts)
+# stay as given.
+#
+# P(win) of a tree ensemble is piecewise constant in m, so expected profit
+# is a saw-tooth and not unimodal, which rules out golden-section search.
+# The search is coarse-to-fine instead: a grid over the whole range,
+# scored as one batch, then finer grids around the best few points, each
+# round again one batch, until the step is below the resolution, the
+# round limit is reached or the latency budget is spent. Evaluations are
+# memoized on m rounded to the resolution, so overlapping grids never
+# score a margin twice.
+#
+#   POST /optimize_bid
+#   {"features": {"materials_cost": ..., "labor_cost": ..., "equipment_cost": ...,
+#                 "overhead_cost": ..., "timeline_days": ..., "roi": ..., "contingency": ...},
+#    "margin_range": [1, 60]}
+#
+# CLI, against a model directory or file:
+#   python optimizer.py --materials 250000 --labor 180000 --equipment 60000 \
+#       --overhead 40000 --timeline-days 180 --roi 18 --contingency 8
+
+COST_FIELDS = ['materials_cost', 'labor_cost', 'equipment_cost', 'overhead_cost']
+MARGIN_RANGE = (1.0, 60.0)
+GRID_POINTS = int(os.environ.get("OPTIMIZER_GRID_POINTS", 256))
+MAX_ROUNDS = int(os.environ.get("OPTIMIZER_MAX_ROUNDS", 6))
+KEEP = 4
+RESOLUTION = 1e-4  # margin percentage points
+BUDGET_MS = float(os.environ.get("OPTIMIZER_BUDGET_MS", 50))
+
+
+class MarginSearch:
+    def __init__(self, bundle, features, budget_ms=BUDGET_MS):
+        self.bundle = bundle
+        self.cost = sum(float(features[name]) for name in COST_FIELDS)
+        if self.cost <= 0:
+            raise SchemaError(422, "costs must add up to more than 0")
+        # bid_total and profit_margin are what is being searched for; the
+        # placeholders (the 0 % margin price) are replaced per variant
+        self.features = {**features, 'bid_total': self.cost, 'profit_margin': 0.0}
+        self.budget = budget_ms / 1000
+        self.memo = {}  # round(m / RESOLUTION) -> (P(win), expected profit)
+        self.batches = 0
+
+    def bid_total(self, margins):
+        return self.cost / (1 - np.asarray(margins) / 100)
+
+    def evaluate(self, margins):
+        # Expected profit of each margin; unseen ones are scored as one batch
+        keys = np.round(np.asarray(margins) / RESOLUTION).astype(np.int64)
+        new = np.array(sorted(set(keys.tolist()) - self.memo.keys()), dtype=np.int64)
+        if len(new):
+            m = new * RESOLUTION
+            bid_total = self.bid_total(m)
+            X = self.bundle.schema.variant_matrix(self.features, {'profit_margin': m, 'bid_total': bid_total})
+            p = self.bundle.predict_proba(X)[:, 1]
+            for key, p_win, profit in zip(new.tolist(), p, p * bid_total * m / 100):
+                self.memo[key] = (float(p_win), float(profit))
+            self.batches += 1
+        return np.array([self.memo[key][1] for key in keys.tolist()])
+
+    def run(self, low, high):
+        start = time.perf_counter()
+        if not 0 <= low < high < 100:
+            raise SchemaError(422, "margin_range must satisfy 0 <= low < high < 100")
+        candidates = np.linspace(low, high, GRID_POINTS)
+        step = candidates[1] - candidates[0]
+        rounds = 0
+        while True:
+            profits = self.evaluate(candidates)
+            rounds += 1
+            if rounds >= MAX_ROUNDS or step <= RESOLUTION or time.perf_counter() - start > self.budget:
+                break
+            # Finer grids over +-1 step around the best few distinct points
+            best = np.unique(candidates[np.argsort(-profits)[:KEEP]])
+            per_point = GRID_POINTS // len(best)
+            candidates = np.clip(np.concatenate([
+                np.linspace(m - step, m + step, per_point) for m in best
+            ]), low, high)
+            step = 2 * step / (per_point - 1)
+        key = max(self.memo, key=lambda k: self.memo[k][1])
+        m = key * RESOLUTION
+        p_win, profit = self.memo[key]
+        return {
+            "profit_margin": m,
+            "bid_total": float(self.bid_total(m)),
+            "win_probability": p_win,
+            "expected_profit": profit,
+            "cost": self.cost,
+            "evaluations": len(self.memo),
+            "batches": self.batches,
+            "rounds": rounds,
+            "elapsed_ms": (time.perf_counter() - start) * 1000,
+        }
+
+
+def optimize(bundle, features, margin_range=MARGIN_RANGE, budget_ms=BUDGET_MS):
+    # Best margin for one cost breakdown (see above), with search stats
+    return MarginSearch(bundle, features, budget_ms).run(*margin_range)
+
+
+def parse_request(body):
+    try:
+        data = orjson.loads(body)
+    except orjson.JSONDecodeError as e:
+        raise SchemaError(400, f"Malformed JSON: {e}")
+    if not isinstance(data, dict) or not isinstance(data.get("features"), dict):
+        raise SchemaError(422, "features: field required")
+    features = data["features"]
+    missing = [name for name in COST_FIELDS if type(features.get(name)) not in (int, float)]
+    if missing:
+        raise SchemaError(422, "; ".join(f"{name}: field required" for name in missing))
+    margin_range = data.get("margin_range", MARGIN_RANGE)
+    if (not isinstance(margin_range, list | tuple) or len(margin_range) != 2
+            or any(type(v) not in (int, float) for v in margin_range)):
+        raise SchemaError(422, "margin_range must be [low, high]")
+    return features, (float(margin_range[0]), float(margin_range[1]))
+
+
+def add_routes(app, name, registry, executor):
+    @app.post("/optimize_bid")
+    async def optimize_bid(request: Request):
+        with metrics.track(name, "optimize_bid") as tracked:
+            if not registry.ready:
+                tracked.outcome = "not_ready"
+                return FastJSONResponse({"error": "model not ready"}, status_code=503)
+            entry = registry.route(request.headers)
+            bundle = entry.current
+            tracked.model = entry.name
+            try:
+                with metrics.PARSE.time():
+                    features, margin_range = parse_request(await request.body())
+                result = await executor.run(optimize, bundle, features, margin_range)
+            except SchemaError as e:
+                tracked.outcome = "invalid"
+                return error_response(e)
+            except Exception as e:
+                tracked.outcome = "error"
+                return FastJSONResponse({"error": str(e)}, status_code=500)
+            return FastJSONResponse({"model": entry.name, "model_version": bundle.version, **result})
+
+
+def main():
+    from bundle import ModelBundle
+
+    parser = argparse.ArgumentParser(description="Profit margin and bid total maximizing P(win) x profit")
+    parser.add_argument("--model", default="model_advanced.arrays")
+    for name in COST_FIELDS:
+        parser.add_argument(f"--{name.split('_')[0]}", type=float, required=True, dest=name)
+    parser.add_argument("--timeline-days", type=float, default=180)
+    parser.add_argument("--roi", type=float, default=15)
+    parser.add_argument("--contingency", type=float, default=10)
+    parser.add_argument("--risk-count", type=float, default=0)
+    parser.add_argument("--permit-count", type=float, default=0)
+    parser.add_argument("--margin-range", type=float, nargs=2, default=MARGIN_RANGE)
+    parser.add_argument("--budget-ms", type=float, default=BUDGET_MS)
+    args = parser.parse_args()
+
+    bundle = ModelBundle.load(args.model)
+    features = {
+        name: getattr(args, name)
+        for name in COST_FIELDS + ['timeline_days', 'roi', 'contingency', 'risk_count', 'permit_count']
+    }
+    print(json.dumps(optimize(bundle, features, tuple(args.margin_range), args.budget_ms), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+import argparse
+import gc
+import importlib
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+
+import uvicorn
+
+# Pre-fork multi-process serving. The master imports the app module, loads
+# every registry bundle once and moves the compiled tree arrays into a
+# read-only shared mapping (ModelRegistry.preload; bundles loaded from
+# .arrays directories are file mappings already), then forks the workers.
+# Workers share those pages and the master's imported code and libraries
+# copy-on-write, so memory per extra worker is only what it allocates
+# itself, rather than a full interpreter plus model as with
+# `uvicorn --workers N`. All workers accept on one listening socket.
+#
+# The master prints per-worker memory and request rate every
+# --report-seconds and restarts workers that exit. Bundles hot-reloaded
+# inside a worker are private to that worker; restart the master to share a
+# new model again.
+#
+# To run: python prefork.py main_advanced --workers 4 --port 8000
+
+
+def memory_mb(pid):
+    # Rss counts shared pages in full for every process; Pss splits them
+    # between the processes sharing them, so the Pss of all workers adds up
+    # to their real footprint
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    except OSError:
+        return {}
+    return {
+        "rss_mb": fields.get("Rss", 0.0),
+        "pss_mb": fields.get("Pss", 0.0),
+        "shared_mb": fields.get("Shared_Clean", 0.0) + fields.get("Shared_Dirty", 0.0),
+        "private_mb": fields.get("Private_Clean", 0.0) + fields.get("Private_Dirty", 0.0),
+    }
+
+
+def counted(app, counters, slot):
+    # ASGI wrapper counting finished HTTP requests in this worker's slot
+    async def wrapper(scope, receive, send):
+        try:
+            await app(scope, receive, send)
+        finally:
+            if scope["type"] == "http":
+                counters[slot] += 1
+    return wrapper
+
+
+class Master:
+    def __init__(self, module_name, workers, host, port, report_seconds):
+        self.module = importlib.import_module(module_name)
+        self.workers = workers
+        self.report_seconds = report_seconds
+        self.counters = multiprocessing.RawArray("q", workers)
+        self.pids = {}  # pid -> slot
+        self.stopping = False
+
+        start = time.perf_counter()
+        self.module.registry.preload()
+        print(f"[prefork] Loaded {module_name} bundles once in {(time.perf_counter() - start) * 1000:.0f} ms")
+        # Objects created so far are never collected, so the collector does
+        # not write to (and un-share) their pages in the workers
+        gc.collect()
+        gc.freeze()
+
+        # proto=IPPROTO_TCP, so asyncio sets TCP_NODELAY on accepted
+        # connections (it skips sockets created with proto 0, and Nagle plus
+        # delayed ACKs would add ~40 ms to every response)
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((host, port))
+        self.socket.listen(2048)
+        self.config = dict(host=host, port=port, log_level=os.environ.get("LOG_LEVEL", "warning"))
+
+    def spawn(self, slot):
+        pid = os.fork()
+        if pid:
+            self.pids[pid] = slot
+            return
+        # Worker: default signal handling, then serve until told to stop
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        code = 0
+        try:
+            app = counted(self.module.app, self.counters, slot)
+            uvicorn.Server(uvicorn.Config(app, **self.config)).run(sockets=[self.socket])
+        except BaseException:
+            code = 1
+        finally:
+            os._exit(code)
+
+    def stop(self, signum, frame):
+        self.stopping = True
+        for pid in self.pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def report(self, previous, elapsed):
+        print(f"[prefork] {'worker':>6s} {'pid':>7s} {'rss_mb':>8s} {'pss_mb':>8s} "
+              f"{'shared_mb':>9s} {'private_mb':>10s} {'req/s':>8s}")
+        totals = {"rss_mb": 0.0, "pss_mb": 0.0, "private_mb": 0.0}
+        rate = 0.0
+        for pid, slot in sorted(self.pids.items(), key=lambda item: item[1]):
+            memory = memory_mb(pid)
+            worker_rate = (self.counters[slot] - previous[slot]) / elapsed
+            rate += worker_rate
+            for key in totals:
+                totals[key] += memory.get(key, 0.0)
+            print(f"[prefork] {slot:6d} {pid:7d} {memory.get('rss_mb', 0):8.1f} {memory.get('pss_mb', 0):8.1f} "
+                  f"{memory.get('shared_mb', 0):9.1f} {memory.get('private_mb', 0):10.1f} {worker_rate:8.1f}")
+        master = memory_mb(os.getpid())
+        print(f"[prefork] {'master':>6s} {os.getpid():7d} {master.get('rss_mb', 0):8.1f} {master.get('pss_mb', 0):8.1f}")
+        print(f"[prefork] {'total':>6s} {'':7s} {totals['rss_mb']:8.1f} {totals['pss_mb'] + master.get('pss_mb', 0):8.1f} "
+              f"{'':9s} {totals['private_mb']:10.1f} {rate:8.1f}")
+        sys.stdout.flush()
+
+    def run(self):
+        for slot in range(self.workers):
+            self.spawn(slot)
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        print(f"[prefork] {self.workers} workers on {self.config['host']}:{self.config['port']}")
+
+        previous = list(self.counters)
+        last_report = time.monotonic()
+        while self.pids:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid:
+                slot = self.pids.pop(pid)
+                if not self.stopping:
+                    print(f"[prefork] Worker {slot} (pid {pid}) exited with status {status}; restarting")
+                    self.spawn(slot)
+                continue
+            now = time.monotonic()
+            if self.report_seconds > 0 and now - last_report >= self.report_seconds and not self.stopping:
+                self.report(previous, now - last_report)
+                previous = list(self.counters)
+                last_report = now
+            time.sleep(0.2)
+        self.socket.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve an ML API module from pre-forked workers")
+    parser.add_argument("module", help="main or main_advanced")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--report-seconds", type=float, default=float(os.environ.get("PREFORK_REPORT_SECONDS", 10)))
+    args = parser.parse_args()
+    Master(args.module, args.workers, args.host, args.port, args.report_seconds).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+import asyncio
+import json
+import os
+import random
+import time
+from collections import deque
+
+import numpy as np
+from fastapi.responses import JSONResponse
+
+from batching import MicroBatcher
+from bundle import ModelBundle
+from executor import InferenceExecutor
+from features import synthetic_bids
+from metrics import BATCH_SIZE
+from reload import HotReloader
+from schema import FastJSONResponse
+
+# Several model bundles behind one /predict. Each hosted model has its own
+# hot-reloadable bundle and micro-batcher; requests are routed by the
+# X-Model header or, without one, by a weighted random split. A shadow model
+# can be scored on a separate background worker for every routed request,
+# which never delays the primary response, and per-model latency plus
+# shadow/primary agreement are tracked so models can be promoted on
+# measured cost and accuracy.
+#
+# MODEL_REGISTRY  JSON object, e.g.
+#   {"advanced": {"model": "model_advanced.arrays", "weight": 0.9},
+#    "basic": {"model": "model.arrays", "weight": 0.1}}
+# SHADOW_MODEL    name of a registered model to shadow-score
+#
+# "model" is an array directory or a pickle (bundle.py); a pickled model
+# may also name a separate "scaler" file applied before it.
+
+MODEL_HEADER = "X-Model"
+
+
+class UnknownModel(Exception):
+    # An X-Model header or ?model= naming no hosted model; answered with a
+    # 404 {"error": ...} by the handler add_routes() installs
+    status_code = 404
+
+    def __init__(self, name):
+        super().__init__(f"unknown model {name}")
+
+
+class LatencyWindow:
+    # Most recent samples, summarized on demand
+    def __init__(self, size=2048):
+        self.samples = deque(maxlen=size)
+        self.count = 0
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+
+    def summary(self):
+        if not self.samples:
+            return {"count": self.count}
+        ms = np.array(self.samples) * 1000
+        return {
+            "count": self.count,
+            "mean_ms": float(ms.mean()),
+            "p50_ms": float(np.percentile(ms, 50)),
+            "p99_ms": float(np.percentile(ms, 99)),
+        }
+
+
+def positive_proba(result):
+    return result["probability"] if result["prediction"] == 1 else 1 - result["probability"]
+
+
+class ModelEntry:
+    def __init__(self, name, model_file, scaler_file=None, weight=1.0, executor=None,
+                 max_batch_size=64, max_wait=0.002):
+        self.name = name
+        self.model_file = model_file
+        self.scaler_file = scaler_file
+        self.weight = float(weight)
+        self.executor = executor
+        self.reloader = HotReloader(name, self.load, self.warm_up, sample=synthetic_bids(32))
+        self.batcher = MicroBatcher(self.score_matrix, max_batch_size, max_wait, executor)
+        # ?explain=true requests are batched separately, as explain_matrix
+        self.explain_batcher = MicroBatcher(self.explain_matrix, max_batch_size, max_wait, executor)
+        self.latency = LatencyWindow()
+        self.batch_size = BATCH_SIZE.labels(name, "micro_batch")
+        # Filled when this entry is the shadow model
+        self.shadow_latency = LatencyWindow()
+        self.compared = 0
+        self.agreed = 0
+        self.abs_diff = 0.0
+
+    @property
+    def current(self):
+        return self.reloader.current
+
+    def load(self):
+        return ModelBundle.load(self.model_file, self.scaler_file)
+
+    async def warm_up(self, bundle):
+        # Single rows and a full batch through featurization, scaler and model
+        rows = synthetic_bids(self.batcher.max_batch_size)
+        for n in (1, 1, len(rows)):
+            await self.executor.run(bundle.score_rows, rows[:n])
+
+    def score_matrix(self, items):
+        # (bundle, feature vector) pairs queued by the batcher, scored as one
+        # matrix per bundle. Each request brings the bundle its cache key
+        # was built from, so a reload between submit and flush cannot cache
+        # one version's result under another's key.
+        return self._per_bundle(items, lambda bundle, X: bundle.score(X))
+
+    def explain_matrix(self, items):
+        # Same, with an explanation per row
+        return self._per_bundle(items, lambda bundle, X: bundle.explain(X))
+
+    def _per_bundle(self, items, score):
+        self.batch_size.observe(len(items))
+        groups = {}  # id(bundle) -> (bundle, item indices); one outside reloads
+        for i, (bundle, _) in enumerate(items):
+            groups.setdefault(id(bundle), (bundle, []))[1].append(i)
+        results = [None] * len(items)
+        for bundle, indices in groups.values():
+            scored = score(bundle, np.vstack([items[i][1] for i in indices]))
+            for i, result in zip(indices, scored):
+                results[i] = result
+        return results
+
+    def stats(self):
+        stats = {
+            "weight": self.weight,
+            **self.reloader.status(),
+            "batcher": self.batcher.stats(),
+            "explain_batcher": self.explain_batcher.stats(),
+            "latency": self.latency.summary(),
+        }
+        if self.compared:
+            stats["shadow"] = {
+                "latency": self.shadow_latency.summary(),
+                "compared": self.compared,
+                "agreement": self.agreed / self.compared,
+                "mean_abs_probability_diff": self.abs_diff / self.compared,
+            }
+        return stats
+
+
+class ModelRegistry:
+    def __init__(self, shadow=None, shadow_backlog=256):
+        self.entries = {}
+        self.shadow = shadow
+        # Shadow scoring gets its own worker and sheds load beyond the backlog
+        self.shadow_executor = InferenceExecutor(workers=1)
+        self.shadow_backlog = shadow_backlog
+        self.shadow_dropped = 0
+        self.tasks = set()
+        # Bundles loaded by a prefork master, handed to the first load_all
+        self.preloaded = None
+
+    @classmethod
+    def from_env(cls, default, executor, **batching):
+        config = json.loads(os.environ.get("MODEL_REGISTRY") or json.dumps(default))
+        registry = cls(shadow=os.environ.get("SHADOW_MODEL") or None)
+        for name, spec in config.items():
+            registry.entries[name] = ModelEntry(
+                name, spec["model"], spec.get("scaler"), spec.get("weight", 1.0),
+                executor=executor, **batching,
+            )
+        if registry.shadow is not None and registry.shadow not in registry.entries:
+            raise ValueError(f"Shadow model {registry.shadow!r} is not registered")
+        # Requests without X-Model are split by weight, so one must be > 0
+        for entry in registry.entries.values():
+            if not entry.weight >= 0:
+                raise ValueError(f"MODEL_REGISTRY: weight of model {entry.name!r} must be at least 0")
+        if not any(entry.weight > 0 for entry in registry.entries.values()):
+            raise ValueError("MODEL_REGISTRY: at least one model needs a weight greater than 0")
+        return registry
+
+    # Startup: load and warm every entry, then install the bundles
+    def load_all(self):
+        if self.preloaded is not None:
+            bundles, self.preloaded = self.preloaded, None
+            return bundles
+        return {name: entry.load() for name, entry in self.entries.items()}
+
+    def preload(self):
+        # Load every bundle now, in shared memory, for workers forked later
+        self.preloaded = {name: bundle.share() for name, bundle in self.load_all().items()}
+
+    async def warm_up_all(self, bundles):
+        for name, bundle in bundles.items():
+            await self.entries[name].warm_up(bundle)
+
+    def install(self, bundles):
+        for name, bundle in bundles.items():
+            self.entries[name].reloader.install(bundle)
+
+    @property
+    def ready(self):
+        return all(entry.current is not None for entry in self.entries.values())
+
+    def route(self, headers):
+        name = headers.get(MODEL_HEADER)
+        if name is not None:
+            if name not in self.entries:
+                raise UnknownModel(name)
+            return self.entries[name]
+        weighted = [entry for entry in self.entries.values() if entry.weight > 0]
+        return random.choices(weighted, weights=[entry.weight for entry in weighted])[0]
+
+    def get(self, name=None):
+        # Named entry, or the highest-weighted one
+        if name is None:
+            return max(self.entries.values(), key=lambda entry: entry.weight)
+        if name not in self.entries:
+            raise UnknownModel(name)
+        return self.entries[name]
+
+    def shadow_score(self, primary, row, result):
+        # Fire-and-forget comparison of the shadow model with a primary result
+        if self.shadow is None or self.shadow == primary.name or "error" in result:
+            return
+        if self.shadow_executor.in_flight >= self.shadow_backlog:
+            self.shadow_dropped += 1
+            return
+        task = asyncio.ensure_future(self._shadow(self.entries[self.shadow], row, result))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _shadow(self, entry, row, primary_result):
+        if entry.current is None:
+            return
+        start = time.perf_counter()
+        try:
+            shadow_result = (await self.shadow_executor.run(entry.current.score_rows, [row]))[0]
+        except Exception:
+            return
+        entry.shadow_latency.record(time.perf_counter() - start)
+        if "error" in shadow_result:
+            return
+        entry.compared += 1
+        entry.agreed += shadow_result["prediction"] == primary_result["prediction"]
+        entry.abs_diff += abs(positive_proba(shadow_result) - positive_proba(primary_result))
+
+    def stats(self):
+        return {
+            "shadow": self.shadow,
+            "shadow_dropped": self.shadow_dropped,
+            "models": {name: entry.stats() for name, entry in self.entries.items()},
+        }
+
+    def add_routes(self, app):
+        @app.exception_handler(UnknownModel)
+        async def unknown_model(request, e):
+            return FastJSONResponse({"error": str(e)}, status_code=404)
+
+        @app.get("/models")
+        async def models():
+            return self.stats()
+
+        @app.post("/admin/reload")
+        async def admin_reload(model: str = None):
+            entry = self.get(model)
+            try:
+                await entry.reloader.reload()
+            except Exception as e:
+                return JSONResponse({"error": str(e), **entry.reloader.status()}, status_code=409)
+            return entry.reloader.status()
+
+        @app.post("/admin/rollback")
+        async def admin_rollback(model: str = None):
+            entry = self.get(model)
+            try:
+                entry.reloader.rollback()
+            except ValueError as e:
+                return JSONResponse({"error": str(e), **entry.reloader.status()}, status_code=409)
+            return entry.reloader.status()
+
+        @app.get("/admin/model")
+        async def admin_model(model: str = None):
+            return self.get(model).reloader.status()
+
+    def stop(self):
+        for entry in self.entries.values():
+            entry.reloader.stop()
+        self.shadow_executor.shutdown()
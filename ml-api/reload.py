@@ -0,0 +1,140 @@
+import asyncio
+import os
+
+import numpy as np
+
+import golden
+
+# Zero-downtime model reload. The active ModelBundle (model and scaler
+# together) is replaced by a single reference assignment, so a request sees
+# either the old pair or the new one, never a mix. A candidate bundle is
+# loaded on a thread, warmed up and validated on a sample set before the
+# swap; the bundle it replaces is kept for instant rollback. With GOLDEN_DIR
+# set, validation also diffs the candidate against the model's golden
+# snapshot (golden.py) and rejects it on label flips or large probability
+# changes.
+#
+# Reloads are triggered by POST /admin/reload (registry.py) or, when
+# RELOAD_POLL_SECONDS is set (> 0), by polling the artifact files for a new
+# mtime/size. A change is picked up once it has been stable for one poll, so
+# a model and scaler written separately are loaded as a pair.
+
+
+def file_signature(paths):
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature.append((path, stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signature.append((path, None, None))
+    return tuple(signature)
+
+
+def validate_bundle(bundle, rows):
+    # Candidate must produce finite binary probabilities for the sample bids
+    X, _, errors = bundle.featurize_rows(rows)
+    if errors:
+        raise ValueError(f"Sample bids could not be featurized: {errors}")
+    proba = bundle.predict_proba(X)
+    if proba.shape != (len(X), 2):
+        raise ValueError(f"Unexpected predict_proba shape {proba.shape}")
+    if not np.all(np.isfinite(proba)) or proba.min() < 0 or proba.max() > 1:
+        raise ValueError("Bundle produced invalid probabilities on the sample set")
+
+
+class HotReloader:
+    def __init__(self, name, load, warm_up, sample, poll_interval=None):
+        self.name = name
+        self.load = load
+        self.warm_up = warm_up
+        self.sample = sample
+        self.poll_interval = float(
+            os.environ.get("RELOAD_POLL_SECONDS", 0) if poll_interval is None else poll_interval
+        )
+        self.current = None
+        self.previous = None
+        self.signature = None
+        self.lock = asyncio.Lock()
+        self.task = None
+        self.reloads = 0
+        self.failures = 0
+        self.last_error = None
+        # Golden diff of the last accepted reload
+        self.golden = None
+
+    def install(self, bundle):
+        # Initial bundle from the startup subsystem
+        self.current = bundle
+        self.signature = file_signature(bundle.paths)
+        if self.poll_interval > 0:
+            self.task = asyncio.create_task(self.watch())
+
+    def status(self):
+        return {
+            "version": self.current.version if self.current else None,
+            "previous_version": self.previous.version if self.previous else None,
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "golden": self.golden,
+        }
+
+    async def reload(self):
+        async with self.lock:
+            try:
+                candidate = await asyncio.to_thread(self.load)
+                await self.warm_up(candidate)
+                validate_bundle(candidate, self.sample)
+                report = golden.gate(self.name, candidate)
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(e)
+                keeping = f"keeping {self.current.version}" if self.current else "no model loaded"
+                print(f"[{self.name}] Reload failed, {keeping}: {e}")
+                raise
+            self.golden = report
+            if self.current is None:
+                # Startup failed to load a model; this reload recovers
+                self.install(candidate)
+                self.reloads += 1
+                self.last_error = None
+                print(f"[{self.name}] Installed model {candidate.version}")
+                return self.current
+            self.signature = file_signature(candidate.paths)
+            if candidate.version == self.current.version:
+                return self.current
+            self.previous, self.current = self.current, candidate
+            self.reloads += 1
+            self.last_error = None
+            print(f"[{self.name}] Swapped model {self.previous.version} -> {self.current.version}")
+            return self.current
+
+    def rollback(self):
+        if self.previous is None:
+            raise ValueError("No previous model to roll back to")
+        self.previous, self.current = self.current, self.previous
+        print(f"[{self.name}] Rolled back to model {self.current.version}")
+        return self.current
+
+    async def watch(self):
+        pending = None
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            signature = file_signature(self.current.paths)
+            if signature == self.signature:
+                pending = None
+            elif signature != pending:
+                # Changed since the last poll; wait until the writes settle
+                pending = signature
+            else:
+                pending = None
+                try:
+                    await self.reload()
+                except Exception:
+                    # Keep serving the current bundle until the files change again
+                    self.signature = signature
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
@@ -0,0 +1,125 @@
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bundle import ModelBundle
+import test_model
+import test_model_advanced
+
+# In-process runner for the test_model.py / test_model_advanced.py cases:
+# no server, no network port. Each suite is scored against every model its
+# app hosts (main.registry / main_advanced.registry, so MODEL_REGISTRY is
+# honoured) and any extra --bundle, all jobs in parallel, and the same
+# summary test_model() prints is shown per suite and model.
+#
+#   default   each job scores all its cases as one batch (bundle.score_rows)
+#   --client  each case goes through the app's /predict with a test client,
+#             X-Model selecting the model, as the HTTP scripts do
+#
+# To run: python run_tests.py [--client] [--bundle advanced=candidate.arrays]
+
+SUITES = {
+    "basic": ("main", test_model.test_cases),
+    "advanced": ("main_advanced", test_model_advanced.test_cases),
+}
+
+
+def app_module(suite):
+    return __import__(SUITES[suite][0])
+
+
+def bundle_jobs(suites, extra):
+    # (suite, model name, bundle) for every hosted model and extra bundle
+    jobs = []
+    for suite in suites:
+        for name, bundle in app_module(suite).registry.load_all().items():
+            jobs.append((suite, name, bundle))
+    for spec in extra:
+        suite, _, path = spec.partition("=")
+        jobs.append((suite, os.path.basename(path), ModelBundle.load(path, model_dir=".")))
+    return jobs
+
+
+def score_direct(job):
+    suite, name, bundle = job
+    start = time.perf_counter()
+    results = bundle.score_rows([case["features"] for case in SUITES[suite][1]])
+    return [(suite, name, bundle.version, results, time.perf_counter() - start)]
+
+
+def score_client(suite):
+    # One test client per app (its lifespan owns the executor), every
+    # hosted model in turn
+    from fastapi.testclient import TestClient
+
+    cases = SUITES[suite][1]
+    module = app_module(suite)
+    scored = []
+    with TestClient(module.app) as client:
+        deadline = time.monotonic() + 30
+        while client.get("/readyz").status_code != 200:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"{SUITES[suite][0]} did not become ready")
+            time.sleep(0.01)
+        for name, entry in module.registry.entries.items():
+            start = time.perf_counter()
+            results = []
+            for case in cases:
+                response = client.post("/predict", json={"features": case["features"]}, headers={"X-Model": name})
+                results.append(response.json() if response.status_code == 200 else {"error": response.text})
+            scored.append((suite, name, entry.current.version, results, time.perf_counter() - start))
+    return scored
+
+
+def check(suite, name, version, results, elapsed):
+    cases = SUITES[suite][1]
+    correct = total = 0
+    incorrect, errors = [], []
+    for i, (case, result) in enumerate(zip(cases, results), 1):
+        if "error" in result:
+            errors.append(f"Test Case {i}: {case['name']}: {result['error']}")
+            continue
+        if "expected" not in case:
+            continue
+        label = 'win' if result['prediction'] == 1 else 'loss'
+        total += 1
+        if label == case['expected']:
+            correct += 1
+        else:
+            incorrect.append(f"   Test Case {i}: {case['name']}: expected {case['expected'].upper()}, "
+                             f"predicted {label.upper()} ({result['probability']:.2%})")
+    print(f"\n{suite} suite, model {name} ({version}): {len(cases)} cases in {elapsed * 1000:.1f} ms")
+    for line in errors:
+        print(f"❌ Error: {line}")
+    if incorrect:
+        print("Incorrect:")
+        print("\n".join(incorrect))
+    test_model.print_summary([case for case in cases if "expected" in case], correct, total)
+    return not errors
+
+
+def run_tests(suites, extra, client):
+    start = time.perf_counter()
+    if client:
+        jobs = [(score_client, suite) for suite in suites]
+        jobs += [(score_direct, job) for job in bundle_jobs([], extra)]
+    else:
+        jobs = [(score_direct, job) for job in bundle_jobs(suites, extra)]
+    with ThreadPoolExecutor(max_workers=len(jobs) or 1) as pool:
+        scored = [result for results in pool.map(lambda job: job[0](job[1]), jobs) for result in results]
+    ok = True
+    for suite, name, version, results, elapsed in scored:
+        ok = check(suite, name, version, results, elapsed) and ok
+    print(f"\n{len(scored)} suite run(s) in {(time.perf_counter() - start) * 1000:.0f} ms")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--suites", nargs="+", choices=list(SUITES), default=list(SUITES))
+    parser.add_argument("--bundle", action="append", default=[], metavar="SUITE=PATH",
+                        help="extra model directory or pickle to run a suite against")
+    parser.add_argument("--client", action="store_true", help="score through the app's /predict")
+    args = parser.parse_args()
+    raise SystemExit(0 if run_tests(args.suites, args.bundle, args.client) else 1)
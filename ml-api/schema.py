@@ -0,0 +1,263 @@
+from typing import TypedDict
+
+import numpy as np
+import orjson
+import pandas as pd
+from starlette.responses import Response
+
+from features import BASE_FEATURES, COUNT_FEATURES, FEATURES, N_BASE, N_FEATURES, PERMIT_COUNT, RISK_COUNT, engineer
+from metrics import SERIALIZE
+
+# Typed request schema for /predict and /predict_batch. Bodies are decoded
+# with orjson and each field is type-checked and written straight into the
+# model's float matrix, with no intermediate DataFrame or per-field dict of
+# converted values. Invalid requests raise SchemaError, which the handlers
+# turn into a 400 (malformed JSON) or 422 (invalid fields) response.
+#
+#   /predict        {"features": {<field>: number, ...}}
+#   /predict_batch  {"features": [{<field>: number, ...}, ...]}
+#
+# bid_total must be greater than 0 and the four cost fields at least 0;
+# other values are rejected as invalid fields. Unknown fields (category,
+# project_budget, ...) are ignored. Rows whose
+# model features come out non-finite (e.g. ratios over a zero bid_total)
+# are rejected like invalid fields, never scored. Responses are
+# Prediction objects (or lists of them) serialized with orjson. With
+# ?explain=true they also carry an Explanation: the model's base
+# probability and each model feature's contribution to the class-1
+# probability, largest first, adding up to the predicted probability.
+
+
+POSITIVE = frozenset(['bid_total'])
+NON_NEGATIVE = frozenset(['materials_cost', 'labor_cost', 'equipment_cost', 'overhead_cost'])
+
+
+def out_of_range(name, values):
+    # (mask of values violating the field's constraint, message) or None
+    if name in POSITIVE:
+        return values <= 0, f"{name}: must be greater than 0"
+    if name in NON_NEGATIVE:
+        return values < 0, f"{name}: must be at least 0"
+    return None
+
+
+class SchemaError(Exception):
+    def __init__(self, status_code, detail):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class Explanation(TypedDict):
+    base: float
+    contributions: dict[str, float]
+
+
+class Prediction(TypedDict, total=False):
+    prediction: int
+    probability: float
+    model_version: str
+    model: str
+    explanation: Explanation
+    error: str
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content):
+        with SERIALIZE.time():
+            return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def error_response(e):
+    return FastJSONResponse({"error": e.detail}, status_code=e.status_code)
+
+
+def query_flag(request, name):
+    # ?name=1 / true / yes
+    return request.query_params.get(name, "").lower() in ("1", "true", "yes")
+
+
+class FeatureSchema:
+    def __init__(self, required, optional, n_columns, engineered):
+        # required / optional: lists of (field, column); optional default 0
+        self.required = required
+        self.optional = optional
+        self.n_columns = n_columns
+        self.engineered = engineered
+        self.features = FEATURES if engineered else BASE_FEATURES
+
+    def fill(self, features, X, i, overridden=()):
+        # Type-check one features object into row i; returns the problems.
+        # Fields in `overridden` are replaced by the caller afterwards, so
+        # their range is not checked here
+        if not isinstance(features, dict):
+            return ["features must be an object"]
+        problems = []
+        row = X[i]
+        for name, column in self.required:
+            value = features.get(name)
+            if value is None:
+                problems.append(f"{name}: field required")
+            elif type(value) is float or type(value) is int:
+                if name in overridden:
+                    row[column] = value
+                elif value <= 0 and name in POSITIVE:
+                    problems.append(f"{name}: must be greater than 0")
+                elif value < 0 and name in NON_NEGATIVE:
+                    problems.append(f"{name}: must be at least 0")
+                else:
+                    row[column] = value
+            else:
+                problems.append(f"{name}: must be a number")
+        for name, column in self.optional:
+            value = features.get(name)
+            if value is None:
+                continue
+            if type(value) is float or type(value) is int:
+                row[column] = value
+            else:
+                problems.append(f"{name}: must be a number")
+        return problems
+
+    def finish(self, X):
+        return engineer(X) if self.engineered else X
+
+    def nonfinite_error(self, x):
+        names = [name for name, value in zip(self.features, x) if not np.isfinite(value)]
+        return f"{', '.join(names)}: not a finite number"
+
+    def finish_checked(self, X):
+        # finish() for a request matrix that must score as a whole
+        X = self.finish(X)
+        finite = np.isfinite(X).all(axis=1)
+        if not finite.all():
+            raise SchemaError(422, self.nonfinite_error(X[np.argmin(finite)]))
+        return X
+
+    def finish_rows(self, X, valid, errors):
+        # finish() for the valid rows of a batch; rows with non-finite
+        # features become errors too. Returns (X, valid, errors).
+        X = self.finish(X)
+        finite = np.isfinite(X).all(axis=1)
+        if not finite.all():
+            rows = np.flatnonzero(valid)
+            for j in np.flatnonzero(~finite):
+                errors[int(rows[j])] = self.nonfinite_error(X[j])
+            valid = valid.copy()
+            valid[rows[~finite]] = False
+            X = X[finite]
+        return X, valid, errors
+
+    @property
+    def columns(self):
+        # Request field -> matrix column, for every raw input field
+        return dict(self.required + self.optional)
+
+    def variant_matrix(self, features, values):
+        # One features object, one row per variant: values maps fields to
+        # equal-length arrays of per-row values. The derived columns are
+        # computed once for the whole matrix. The overridden fields are
+        # range-checked on their variant values, not on the base row.
+        X = np.zeros((1, self.n_columns))
+        problems = self.fill(features, X, 0, overridden=values.keys())
+        if problems:
+            raise SchemaError(422, "; ".join(problems))
+        X = np.repeat(X, len(next(iter(values.values()))), axis=0)
+        columns = self.columns
+        for name, column_values in values.items():
+            X[:, columns[name]] = column_values
+            constraint = out_of_range(name, X[:, columns[name]])
+            if constraint is not None and constraint[0].any():
+                raise SchemaError(422, constraint[1])
+        return self.finish_checked(X)
+
+    def grid_matrix(self, features, axes):
+        # Variants over the grid of axes, a list of (field, values); one
+        # row per grid point, first axis slowest
+        grids = np.meshgrid(*[values for _, values in axes], indexing="ij")
+        return self.variant_matrix(features, {name: grid.ravel() for (name, _), grid in zip(axes, grids)})
+
+    def matrix(self, features):
+        # One parsed features object -> (1, n_columns) matrix
+        X = np.zeros((1, self.n_columns))
+        problems = self.fill(features, X, 0)
+        if problems:
+            raise SchemaError(422, "; ".join(problems))
+        return self.finish_checked(X)
+
+    def batch_matrix(self, rows):
+        # Parsed list of features objects -> (matrix of valid rows,
+        # valid mask, {index: error})
+        if not isinstance(rows, list):
+            raise SchemaError(422, "features must be a list of objects")
+        X = np.zeros((len(rows), self.n_columns))
+        errors = {}
+        for i, features in enumerate(rows):
+            problems = self.fill(features, X, i)
+            if problems:
+                errors[i] = "; ".join(problems)
+        valid = np.ones(len(rows), dtype=bool)
+        if errors:
+            valid[list(errors)] = False
+            X = X[valid]
+        return self.finish_rows(X, valid, errors)
+
+    def frame_matrix(self, df):
+        # Prepared export DataFrame (features.prepare_export) -> (matrix of
+        # valid rows, valid mask, {index: error}), column by column
+        columns = {name: pd.to_numeric(df[name], errors="coerce") for name in self.columns if name in df.columns}
+        return self.column_matrix(columns, len(df))
+
+    def column_matrix(self, columns, n_rows):
+        # {field: column of n_rows numbers} -> (matrix of valid rows, valid
+        # mask, {index: error}); rows with a required field missing, NaN or
+        # out of range are invalid, absent optional fields are 0
+        X = np.zeros((n_rows, self.n_columns))
+        checks = []  # (mask of failing rows, message)
+        for name, column in self.required:
+            if name in columns:
+                X[:, column] = columns[name]
+            else:
+                X[:, column] = np.nan
+            checks.append((np.isnan(X[:, column]), f"{name}: missing or not a number"))
+            constraint = out_of_range(name, X[:, column])
+            if constraint is not None:
+                checks.append(constraint)
+        for name, column in self.optional:
+            if name in columns:
+                X[:, column] = columns[name]
+        valid = ~np.any([mask for mask, _ in checks], axis=0) if checks else np.ones(n_rows, dtype=bool)
+        errors = {}
+        for i in np.flatnonzero(~valid):
+            errors[int(i)] = "; ".join(message for mask, message in checks if mask[i])
+        return self.finish_rows(X[valid], valid, errors)
+
+
+def parse_features(body):
+    # Request body -> its "features" member
+    try:
+        data = orjson.loads(body)
+    except orjson.JSONDecodeError as e:
+        raise SchemaError(400, f"Malformed JSON: {e}")
+    if not isinstance(data, dict) or "features" not in data:
+        raise SchemaError(422, "features: field required")
+    return data["features"]
+
+
+# 9 raw features, as used by model.pkl
+BASE_SCHEMA = FeatureSchema(
+    required=[(name, i) for i, name in enumerate(BASE_FEATURES)],
+    optional=[],
+    n_columns=N_BASE,
+    engineered=False,
+)
+
+# 19 engineered features, as used by model_advanced_bundle.pkl
+ADVANCED_SCHEMA = FeatureSchema(
+    required=[(name, i) for i, name in enumerate(BASE_FEATURES)],
+    optional=list(zip(COUNT_FEATURES, [RISK_COUNT, PERMIT_COUNT])),
+    n_columns=N_FEATURES,
+    engineered=True,
+)
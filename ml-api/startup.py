@@ -0,0 +1,61 @@
+import asyncio
+import time
+
+from fastapi.responses import JSONResponse
+
+# Startup subsystem shared by main.py and main_advanced.py. Artifacts are
+# loaded after the server starts accepting connections, on a thread so the
+# event loop keeps answering /healthz, and a synthetic batch is pushed
+# through the full pipeline before /readyz reports ready. Orchestrators
+# should route traffic on /readyz only.
+
+
+class Startup:
+    def __init__(self, name):
+        self.name = name
+        # Measured from import, i.e. roughly process start
+        self.started = time.perf_counter()
+        self.ready = False
+        self.error = None
+        self.timings = {}
+
+    async def run(self, load, warm_up):
+        # load: blocking callable returning the model bundle
+        # warm_up: coroutine function scoring synthetic rows with that bundle
+        # Returns None if either step fails; /readyz then reports the error.
+        try:
+            start = time.perf_counter()
+            bundle = await asyncio.to_thread(load)
+            self.timings["load_ms"] = (time.perf_counter() - start) * 1000
+
+            start = time.perf_counter()
+            await warm_up(bundle)
+            self.timings["warmup_ms"] = (time.perf_counter() - start) * 1000
+        except Exception as e:
+            self.error = str(e)
+            print(f"[{self.name}] Startup failed: {e}")
+            return None
+        self.timings["startup_ms"] = (time.perf_counter() - self.started) * 1000
+        self.ready = True
+        print(
+            f"[{self.name}] Ready in {self.timings['startup_ms']:.0f} ms "
+            f"(load {self.timings['load_ms']:.0f} ms, warm-up {self.timings['warmup_ms']:.0f} ms)"
+        )
+        return bundle
+
+    def first_request(self, seconds):
+        if "first_request_ms" not in self.timings:
+            self.timings["first_request_ms"] = seconds * 1000
+            print(f"[{self.name}] First request served in {seconds * 1000:.2f} ms")
+
+    def add_routes(self, app):
+        @app.get("/healthz")
+        async def healthz():
+            return {"status": "ok"}
+
+        @app.get("/readyz")
+        async def readyz():
+            if self.ready:
+                return {"status": "ready", **self.timings}
+            status = "failed" if self.error else "starting"
+            return JSONResponse({"status": status, "error": self.error}, status_code=503)
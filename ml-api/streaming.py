@@ -0,0 +1,227 @@
+import asyncio
+import csv
+import os
+import tempfile
+
+import orjson
+import pandas as pd
+from fastapi import Request
+from starlette.responses import StreamingResponse
+
+import metrics
+from features import prepare_export
+from schema import FastJSONResponse
+
+# Streaming bulk scoring for whole bid exports:
+#
+#   POST /predict_stream    Content-Type: text/csv             (bids.csv layout)
+#                           Content-Type: application/x-ndjson (one object per line)
+#
+# The body is read incrementally, cut into chunks of STREAM_CHUNK_ROWS
+# records, and each chunk is prepared like bids.csv in train_model_advanced.py
+# (total_cost renamed, timeline_days / risk_count / permit_count derived
+# from the raw columns for records that do not send them; a record with an
+# unparseable date gets an error line of its own) and scored as one matrix
+# on the inference executor. Results are streamed back as NDJSON, one line per
+# input record in input order:
+#
+#   {"row": 0, "id": 1, "prediction": 1, "probability": 0.71, "model_version": "..."}
+#   {"row": 1, "id": 2, "error": "contingency: missing or not a number"}
+#
+# ("id" is echoed when the input has one.) Scored chunks go to a spool that
+# the response drains as the client reads. Most HTTP clients (requests,
+# httpx) upload the whole body before reading any of the response, so
+# reading the body never waits on the client reading results: whatever it
+# has not read yet stays in memory up to STREAM_SPOOL_MB and then spills to
+# a temporary file. Memory therefore stays bounded by the chunk size and
+# the spool limit however large the upload is. A failure mid-stream ends
+# the response with a single {"error": ...} line.
+
+CHUNK_ROWS = int(os.environ.get("STREAM_CHUNK_ROWS", 1024))
+SPOOL_BYTES = int(float(os.environ.get("STREAM_SPOOL_MB", 8)) * 1024 * 1024)
+READ_BYTES = 1024 * 1024
+
+
+class NDJSONStream(StreamingResponse):
+    media_type = "application/x-ndjson"
+
+    async def __call__(self, scope, receive, send):
+        # StreamingResponse normally listens for a disconnect on receive()
+        # while streaming, which would swallow the request body this
+        # response is still reading; a disconnect surfaces from the body
+        # stream or from send() instead
+        await self.stream_response(send)
+
+
+async def _lines(stream):
+    # Body chunks -> physical lines without the trailing newline
+    rest = b""
+    async for chunk in stream:
+        *lines, rest = (rest + chunk).split(b"\n")
+        for line in lines:
+            yield line
+    if rest:
+        yield rest
+
+
+async def _csv_records(lines):
+    # Physical lines -> CSV records; quoted fields (risk and permit lists)
+    # span several lines, so a record ends where its quotes balance
+    record, quotes = [], 0
+    async for line in lines:
+        record.append(line)
+        quotes += line.count(b'"')
+        if quotes % 2 == 0:
+            if any(part.strip() for part in record):
+                yield b"\n".join(record)
+            record, quotes = [], 0
+    if record:
+        yield b"\n".join(record)
+
+
+async def _ndjson_records(lines):
+    async for line in lines:
+        if line.strip():
+            yield line
+
+
+async def _chunks(records, size):
+    chunk = []
+    async for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _parse_csv(header, records):
+    # One dict per record, or the error text for records that do not parse
+    rows = []
+    for record in records:
+        fields = next(csv.reader([record.decode("utf-8", "replace")]), [])
+        if len(fields) != len(header):
+            rows.append(f"expected {len(header)} fields, got {len(fields)}")
+        else:
+            rows.append(dict(zip(header, fields)))
+    return rows
+
+
+def _parse_ndjson(records):
+    rows = []
+    for record in records:
+        try:
+            row = orjson.loads(record)
+        except orjson.JSONDecodeError as e:
+            rows.append(f"Malformed JSON: {e}")
+            continue
+        rows.append(row if isinstance(row, dict) else "record must be an object")
+    return rows
+
+
+def score_chunk(bundle, rows, first_row):
+    # Parsed rows of one chunk -> NDJSON bytes of their results
+    parsed = [i for i, row in enumerate(rows) if isinstance(row, dict)]
+    results = [{"error": row} if isinstance(row, str) else None for row in rows]
+    if parsed:
+        df = prepare_export(pd.DataFrame([rows[i] for i in parsed]))
+        for i, result in zip(parsed, bundle.score_frame(df)):
+            results[i] = result
+    lines = []
+    for i, result in enumerate(results):
+        line = {"row": first_row + i}
+        if isinstance(rows[i], dict) and "id" in rows[i]:
+            line["id"] = rows[i]["id"]
+        line.update(result)
+        lines.append(orjson.dumps(line, option=orjson.OPT_SERIALIZE_NUMPY))
+    return b"\n".join(lines) + b"\n"
+
+
+class Spool:
+    # Results written but not yet sent, in memory up to max_size bytes and
+    # on disk beyond; rewound whenever the reader catches up
+    def __init__(self, max_size=SPOOL_BYTES):
+        self.file = tempfile.SpooledTemporaryFile(max_size=max_size)
+        self.read_pos = 0
+        self.write_pos = 0
+        self.closed = False
+        self.ready = asyncio.Event()
+
+    def write(self, data):
+        self.file.seek(self.write_pos)
+        self.file.write(data)
+        self.write_pos += len(data)
+        self.ready.set()
+
+    def close(self):
+        self.closed = True
+        self.ready.set()
+
+    async def drain(self):
+        try:
+            while True:
+                if self.read_pos < self.write_pos:
+                    self.file.seek(self.read_pos)
+                    data = self.file.read(min(READ_BYTES, self.write_pos - self.read_pos))
+                    self.read_pos += len(data)
+                    if self.read_pos == self.write_pos:
+                        self.read_pos = self.write_pos = 0
+                    yield data
+                elif self.closed:
+                    return
+                else:
+                    self.ready.clear()
+                    await self.ready.wait()
+        finally:
+            self.file.close()
+
+
+def add_routes(app, name, registry, executor, chunk_rows=CHUNK_ROWS):
+    @app.post("/predict_stream")
+    async def predict_stream(request: Request):
+        if not registry.ready:
+            return FastJSONResponse({"error": "model not ready"}, status_code=503)
+        entry = registry.route(request.headers)
+        # One bundle for the whole stream, even if a reload lands midway
+        bundle = entry.current
+        is_csv = "csv" in request.headers.get("content-type", "")
+        batch_size = metrics.BATCH_SIZE.labels(entry.name, "stream")
+
+        async def produce(spool):
+            with metrics.track(name, "predict_stream") as tracked:
+                tracked.model = entry.name
+                lines = _lines(request.stream())
+                records = _csv_records(lines) if is_csv else _ndjson_records(lines)
+                header = None
+                first_row = 0
+                try:
+                    async for chunk in _chunks(records, chunk_rows):
+                        if is_csv and header is None:
+                            header = next(csv.reader([chunk.pop(0).decode("utf-8", "replace")]))
+                            if not chunk:
+                                continue
+                        if is_csv:
+                            rows = await executor.run(_parse_csv, header, chunk)
+                        else:
+                            rows = await executor.run(_parse_ndjson, chunk)
+                        batch_size.observe(len(rows))
+                        spool.write(await executor.run(score_chunk, bundle, rows, first_row))
+                        first_row += len(rows)
+                except Exception as e:
+                    tracked.outcome = "error"
+                    spool.write(orjson.dumps({"error": str(e), "row": first_row}) + b"\n")
+                finally:
+                    spool.close()
+
+        async def results():
+            spool = Spool()
+            producer = asyncio.create_task(produce(spool))
+            try:
+                async for data in spool.drain():
+                    yield data
+            finally:
+                # Client gone before the end: stop reading and scoring
+                producer.cancel()
+
+        return NDJSONStream(results())
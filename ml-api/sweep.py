@@ -0,0 +1,102 @@
+import os
+
+import numpy as np
+import orjson
+from fastapi import Request
+
+import metrics
+from schema import FastJSONResponse, SchemaError, error_response
+
+# What-if sweeps: win probability of one bid as one or two of its fields
+# vary, for probability curves and surfaces.
+#
+#   POST /predict_sweep
+#   {"features": {<bid>},
+#    "sweep": [{"feature": "profit_margin", "start": 5, "stop": 40, "steps": 100},
+#              {"feature": "contingency", "values": [0, 5, 10, 15, 20]}]}
+#
+# Each axis is either explicit "values" or "steps" evenly spaced points from
+# "start" to "stop" inclusive, over any raw input field of the model
+# (derived features such as the ratios follow from them). The grid is
+# expanded server-side, its derived features are computed in one array
+# pass and it is scored in one model call:
+#
+#   {"model": "advanced", "model_version": "...", "probability": 0.41,
+#    "axes": [{"feature": "profit_margin", "values": [...]}, ...],
+#    "surface": [[...], ...]}
+#
+# "probability" is the unchanged bid; surface[i][j] is the bid with the
+# first field at values[i] and the second at values[j].
+
+MAX_POINTS = int(os.environ.get("SWEEP_MAX_POINTS", 10000))
+
+
+def parse_axis(axis, columns):
+    if not isinstance(axis, dict):
+        raise SchemaError(422, "sweep: each axis must be an object")
+    name = axis.get("feature")
+    if name not in columns:
+        raise SchemaError(422, f"sweep: feature must be one of {', '.join(columns)}")
+    try:
+        if "values" in axis:
+            values = np.array(axis["values"], dtype=float)
+        else:
+            steps = axis["steps"]
+            if type(steps) is not int or steps < 1:
+                raise SchemaError(422, f"sweep {name}: steps must be a positive integer")
+            values = np.linspace(float(axis["start"]), float(axis["stop"]), steps)
+    except (KeyError, TypeError, ValueError):
+        raise SchemaError(422, f"sweep {name}: give values, or start, stop and steps")
+    if values.ndim != 1 or not len(values) or not np.isfinite(values).all():
+        raise SchemaError(422, f"sweep {name}: values must be a non-empty list of numbers")
+    return name, values
+
+
+def parse_sweep(body, schema):
+    # Request body -> (features, [(field, values), ...])
+    try:
+        data = orjson.loads(body)
+    except orjson.JSONDecodeError as e:
+        raise SchemaError(400, f"Malformed JSON: {e}")
+    if not isinstance(data, dict) or "features" not in data:
+        raise SchemaError(422, "features: field required")
+    sweep = data.get("sweep")
+    if not isinstance(sweep, list) or not 1 <= len(sweep) <= 2:
+        raise SchemaError(422, "sweep: a list of one or two axes is required")
+    axes = [parse_axis(axis, schema.columns) for axis in sweep]
+    if len({name for name, _ in axes}) != len(axes):
+        raise SchemaError(422, "sweep: each feature can be swept once")
+    points = int(np.prod([len(values) for _, values in axes]))
+    if points > MAX_POINTS:
+        raise SchemaError(422, f"sweep: {points} grid points, at most {MAX_POINTS} allowed")
+    return data["features"], axes
+
+
+def add_routes(app, name, registry, executor):
+    @app.post("/predict_sweep")
+    async def predict_sweep(request: Request):
+        with metrics.track(name, "predict_sweep") as tracked:
+            if not registry.ready:
+                tracked.outcome = "not_ready"
+                return FastJSONResponse({"error": "model not ready"}, status_code=503)
+            entry = registry.route(request.headers)
+            bundle = entry.current
+            tracked.model = entry.name
+            try:
+                with metrics.PARSE.time():
+                    features, axes = parse_sweep(await request.body(), bundle.schema)
+                metrics.BATCH_SIZE.labels(entry.name, "sweep").observe(int(np.prod([len(v) for _, v in axes])) + 1)
+                probability, surface = await executor.run(bundle.sweep, features, axes)
+            except SchemaError as e:
+                tracked.outcome = "invalid"
+                return error_response(e)
+            except Exception as e:
+                tracked.outcome = "error"
+                return FastJSONResponse({"error": str(e)}, status_code=500)
+            return FastJSONResponse({
+                "model": entry.name,
+                "model_version": bundle.version,
+                "probability": probability,
+                "axes": [{"feature": field, "values": values} for field, values in axes],
+                "surface": surface,
+            })
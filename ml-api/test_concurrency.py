@@ -0,0 +1,294 @@
+import asyncio
+
+import httpx
+import numpy as np
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+import admission
+from admission import AdmissionController, Shed
+from batching import MicroBatcher
+from cache import PredictionCache
+
+# Admission control, micro-batching and the prediction cache, driven on a
+# bare event loop: no model, no server.
+# To run: python -m pytest test_concurrency.py
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+async def settle():
+    # Let every ready callback and task step run
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+# Admission control
+
+def test_admission_queue_full():
+    async def scenario():
+        controller = AdmissionController(concurrency=1, max_queue=1, deadline_ms=1000)
+        await controller.acquire("/predict", None)
+        queued = asyncio.create_task(controller.acquire("/predict", None))
+        await settle()
+        assert controller.queued == 1
+        with pytest.raises(Shed) as shed:
+            await controller.acquire("/predict", None)
+        assert (shed.value.status_code, shed.value.reason) == (429, "queue_full")
+        controller.release()
+        await queued
+        assert (controller.running, controller.queued) == (1, 0)
+
+    run(scenario())
+
+
+def test_admission_deadline_expires_while_queued():
+    async def scenario():
+        controller = AdmissionController(concurrency=1, max_queue=4, deadline_ms=1000)
+        await controller.acquire("/predict", None)
+        with pytest.raises(Shed) as shed:
+            await controller.acquire("/predict", 0.02)
+        assert (shed.value.status_code, shed.value.reason) == (503, "expired")
+        assert controller.queued == 0
+        # The expired request gave up its place: the slot is not handed to it
+        controller.release()
+        assert controller.running == 0
+
+    run(scenario())
+
+
+def test_admission_cancelled_waiter_passes_slot_on():
+    async def scenario():
+        controller = AdmissionController(concurrency=1, max_queue=4, deadline_ms=1000)
+        await controller.acquire("/predict", None)
+        cancelled = asyncio.create_task(controller.acquire("/predict", None))
+        next_in_line = asyncio.create_task(controller.acquire("/predict", None))
+        await settle()
+        cancelled.cancel()
+        await settle()
+        assert cancelled.cancelled()
+        controller.release()
+        await asyncio.wait_for(next_in_line, 1)
+        assert (controller.running, controller.queued) == (1, 0)
+        controller.release()
+        assert controller.running == 0
+
+    run(scenario())
+
+
+def test_admission_middleware_answers_429_with_json():
+    async def scenario():
+        gate = asyncio.Event()
+
+        async def predict(request):
+            await gate.wait()
+            return JSONResponse({"prediction": 1})
+
+        controller = AdmissionController(concurrency=1, max_queue=0, deadline_ms=1000)
+        app = Starlette(routes=[Route("/predict", predict, methods=["POST"])])
+        app.add_middleware(admission.AdmissionMiddleware, name="test", controller=controller)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            running = asyncio.create_task(client.post("/predict"))
+            await settle()
+            shed = await client.post("/predict")
+            gate.set()
+            assert (await running).status_code == 200
+        assert shed.status_code == 429
+        assert shed.json()["reason"] == "queue_full"
+        assert "Retry-After" in shed.headers
+        assert controller.running == 0
+
+    run(scenario())
+
+
+# Micro-batching
+
+def score_items(items):
+    return [{"error": "negative"} if x < 0 else {"prediction": x} for x in items]
+
+
+def test_batcher_flushes_on_size():
+    async def scenario():
+        batches = []
+        batcher = MicroBatcher(lambda items: batches.append(list(items)) or score_items(items),
+                               max_batch_size=3, max_wait=10.0)
+        # Arrivals look busy, so the batcher would otherwise wait max_wait
+        batcher.interarrival = 0.001
+        results = await asyncio.wait_for(asyncio.gather(*(batcher.submit(x) for x in (1, 2, 3))), 1)
+        assert batches == [[1, 2, 3]]
+        assert [result["prediction"] for result in results] == [1, 2, 3]
+
+    run(scenario())
+
+
+def test_batcher_flushes_on_timeout():
+    async def scenario():
+        batches = []
+        batcher = MicroBatcher(lambda items: batches.append(list(items)) or score_items(items),
+                               max_batch_size=64, max_wait=0.02)
+        batcher.interarrival = 0.001
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        results = await asyncio.gather(batcher.submit(1), batcher.submit(2))
+        assert loop.time() - start >= 0.015
+        assert batches == [[1, 2]]
+        assert results == [{"prediction": 1}, {"prediction": 2}]
+
+    run(scenario())
+
+
+def test_batcher_row_error_stays_with_its_row():
+    async def scenario():
+        batcher = MicroBatcher(score_items, max_batch_size=3, max_wait=0.01)
+        results = await asyncio.gather(batcher.submit(1), batcher.submit(-1), batcher.submit(2))
+        assert results == [{"prediction": 1}, {"error": "negative"}, {"prediction": 2}]
+        assert batcher.batches == 1
+
+    run(scenario())
+
+
+def test_batcher_failure_reaches_every_caller():
+    async def scenario():
+        def broken(items):
+            raise RuntimeError("model failed")
+
+        batcher = MicroBatcher(broken, max_batch_size=2)
+        results = await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+    run(scenario())
+
+
+# Prediction cache
+
+def test_cache_ttl_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("cache.time.monotonic", lambda: now[0])
+    cache = PredictionCache(max_size=4, ttl=10.0)
+    cache.put("k", {"prediction": 1})
+    now[0] += 5
+    assert cache.get("k") == {"prediction": 1}
+    now[0] += 6
+    assert cache.get("k") is None
+    assert cache.expirations == 1 and not cache.entries
+
+
+def test_cache_lru_eviction():
+    cache = PredictionCache(max_size=2)
+    cache.put("a", {"prediction": 0})
+    cache.put("b", {"prediction": 1})
+    # A read makes "a" the most recently used, so "b" goes first
+    assert cache.get("a") is not None
+    cache.put("c", {"prediction": 1})
+    assert list(cache.entries) == ["a", "c"]
+    assert cache.evictions == 1
+
+
+def test_cache_key_rounding():
+    cache = PredictionCache(decimals=2)
+    assert cache.key("v1", [1.001, -0.0]) == cache.key("v1", [1.0, 0.0])
+    assert cache.key("v1", [1.0]) != cache.key("v2", [1.0])
+
+
+def test_cache_coalesces_identical_requests():
+    async def scenario():
+        cache = PredictionCache()
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return {"prediction": 1}
+
+        results = await asyncio.gather(*(cache.get_or_compute("k", compute) for _ in range(5)))
+        assert results == [{"prediction": 1}] * 5
+        assert len(calls) == 1
+        assert (cache.misses, cache.coalesced) == (1, 4)
+        assert await cache.get_or_compute("k", compute) == {"prediction": 1}
+        assert cache.hits == 1 and not cache.in_flight
+
+    run(scenario())
+
+
+def test_cache_does_not_store_errors():
+    async def scenario():
+        cache = PredictionCache()
+
+        async def compute():
+            return {"error": "negative"}
+
+        assert await cache.get_or_compute("k", compute) == {"error": "negative"}
+        assert not cache.entries and not cache.in_flight
+
+    run(scenario())
+
+
+def test_cache_leader_cancelled():
+    async def scenario():
+        cache = PredictionCache()
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.02)
+            return {"prediction": 1}
+
+        leader = asyncio.create_task(cache.get_or_compute("k", compute))
+        await settle()
+        followers = [asyncio.create_task(cache.get_or_compute("k", compute)) for _ in range(3)]
+        await settle()
+        leader.cancel()
+        results = await asyncio.wait_for(asyncio.gather(*followers), 1)
+        assert leader.cancelled()
+        # One follower took over the scoring, the others waited for it
+        assert results == [{"prediction": 1}] * 3
+        assert len(calls) == 2
+        assert not cache.in_flight and cache.get("k") == {"prediction": 1}
+
+    run(scenario())
+
+
+def test_cache_leader_failure_reaches_followers():
+    async def scenario():
+        cache = PredictionCache()
+
+        async def compute():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("model failed")
+
+        results = await asyncio.gather(*(cache.get_or_compute("k", compute) for _ in range(3)),
+                                       return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert not cache.in_flight and not cache.entries
+
+    run(scenario())
+
+
+# Registry batches
+
+class FakeBundle:
+    def __init__(self, version):
+        self.version = version
+
+    def score(self, X):
+        return [{"prediction": int(x[0]), "model_version": self.version} for x in X]
+
+
+def test_batch_rows_scored_by_their_own_bundle():
+    # A reload between submit and flush must not score a queued row with
+    # the new bundle: its cache key names the old version
+    from registry import ModelEntry
+
+    entry = ModelEntry("test", "model.arrays")
+    old, new = FakeBundle("v1"), FakeBundle("v2")
+    items = [(old, np.array([1.0])), (new, np.array([2.0])), (old, np.array([3.0]))]
+    assert entry.score_matrix(items) == [
+        {"prediction": 1, "model_version": "v1"},
+        {"prediction": 2, "model_version": "v2"},
+        {"prediction": 3, "model_version": "v1"},
+    ]
@@ -0,0 +1,33 @@
+import os
+import re
+
+from schema import ADVANCED_SCHEMA, BASE_SCHEMA
+
+# Checks that the web app's call to /predict sends every field the feature
+# schemas require. A field it leaves out is rejected with a 422 and the
+# analysis silently falls back to the rule-based score.
+# To run: python test_contract.py
+
+ROUTE = os.path.join(os.path.dirname(__file__), "..", "app", "api", "ai", "analyze-bid", "route.ts")
+
+
+def route_features(path=ROUTE):
+    # Top-level keys of the `const features = {...}` object in the route
+    with open(path) as f:
+        source = f.read()
+    match = re.search(r"^(\s*)const features = \{\n(.*?)^\1\};", source, re.S | re.M)
+    assert match, f"no features object in {path}"
+    indent = len(match.group(1)) + 2
+    return set(re.findall(rf"^ {{{indent}}}(\w+):", match.group(2), re.M))
+
+
+def test_route_sends_required_fields():
+    sent = route_features()
+    for name, schema in [("basic", BASE_SCHEMA), ("advanced", ADVANCED_SCHEMA)]:
+        missing = [field for field, _ in schema.required if field not in sent]
+        assert not missing, f"analyze-bid does not send {missing} required by the {name} schema"
+
+
+if __name__ == "__main__":
+    test_route_sends_required_fields()
+    print(f"analyze-bid sends {sorted(route_features())}")
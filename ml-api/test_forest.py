@@ -0,0 +1,123 @@
+import shutil
+import time
+import warnings
+
+import joblib
+import numpy as np
+
+from bundle import ModelBundle
+from features import BASE_FEATURES, from_dicts, from_frame
+from forest import CompiledModel, compile_model
+from benchmark_features import load_bids
+from test_model_advanced import test_cases
+
+warnings.filterwarnings("ignore", message="X does not have valid feature names")
+
+# Parity and latency check of the compiled tree engine against sklearn.
+# Needs model.pkl, model_advanced_bundle.pkl and their exported .arrays
+# directories from the training scripts.
+# To run: python test_forest.py
+
+
+def reference_inputs():
+    # Reference bids plus every row of bids.csv, in the 19-feature layout
+    X_cases, _, _ = from_dicts([case["features"] for case in test_cases])
+    return np.vstack([X_cases, from_frame(load_bids())])
+
+
+def latency(fn, X, repeat=200):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(X)
+        samples.append(time.perf_counter() - start)
+    return np.percentile(samples, 50) * 1e6, np.percentile(samples, 99) * 1e6
+
+
+def check(name, model, X):
+    compiled = compile_model(model)
+    assert isinstance(compiled, CompiledModel), f"{name} was not compiled"
+
+    proba_match = np.allclose(compiled.predict_proba(X), model.predict_proba(X), rtol=0, atol=1e-9)
+    label_match = np.array_equal(compiled.predict(X), model.predict(X))
+    print(f"\n{name}")
+    print("-" * 50)
+    print(f"Rows: {len(X)}, trees: {len(compiled.roots)}, depth: {compiled.depth}")
+    print(f"predict_proba matches sklearn: {proba_match}")
+    print(f"predict matches sklearn: {label_match}")
+
+    row = X[:1]
+    sk_p50, sk_p99 = latency(model.predict_proba, row, repeat=50)
+    c_p50, c_p99 = latency(compiled.predict_proba, row)
+    print(f"Single row sklearn:  p50 {sk_p50:9.1f} us  p99 {sk_p99:9.1f} us")
+    print(f"Single row compiled: p50 {c_p50:9.1f} us  p99 {c_p99:9.1f} us  ({sk_p50 / c_p50:.0f}x)")
+    return proba_match and label_match
+
+
+def check_arrays(name, model, X):
+    # The exported node arrays, memory-mapped, against sklearn
+    bundle = ModelBundle.load(name)
+    arrays = bundle.model
+    match = np.allclose(arrays.predict_proba(X), model.predict_proba(X), rtol=0, atol=1e-9)
+    # A model without trees (e.g. a compressed logistic regression) has
+    # nothing to map
+    mapped = isinstance(arrays.threshold, np.memmap) or not arrays.threshold.size
+    print(f"{name}: memory-mapped {mapped}, threshold {arrays.threshold.dtype}, "
+          f"feature {arrays.feature.dtype}, matches sklearn: {match}")
+    return match and mapped
+
+
+def test_forest():
+    print("Testing Compiled Tree Engine...")
+    print("=" * 50)
+    X = reference_inputs()
+
+    ok = check("model.pkl", joblib.load("model.pkl"), X[:, :len(BASE_FEATURES)])
+    # The ensemble's logistic regression carries its own StandardScaler,
+    # which the compiled model folds into the coefficients
+    advanced = joblib.load("model_advanced_bundle.pkl")["model"]
+    ok = check("model_advanced_bundle.pkl", advanced, X) and ok
+
+    print()
+    ok = check_arrays("model.arrays", joblib.load("model.pkl"), X[:, :len(BASE_FEATURES)]) and ok
+    ok = check_arrays("model_advanced.arrays", advanced, X) and ok
+    assert ok
+
+
+
+def test_array_hashes(tmp_path):
+    # A changed array file loads unless its manifest hash is checked
+    path = tmp_path / "model.arrays"
+    shutil.copytree("model.arrays", path)
+    ModelBundle.load_arrays(str(path), verify_hashes=True)
+    roots = np.load(path / "roots.npy")
+    np.save(path / "roots.npy", roots[::-1].copy())
+    try:
+        ModelBundle.load_arrays(str(path), verify_hashes=True)
+    except ValueError as e:
+        assert "manifest hash" in str(e)
+    else:
+        raise AssertionError("a changed array file passed the hash check")
+
+
+
+def test_voting_weights_with_dropped_member():
+    # Weights must stay with their estimators when one member is 'drop'
+    from sklearn.ensemble import RandomForestClassifier, VotingClassifier
+    from sklearn.linear_model import LogisticRegression
+
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(200, 4))
+    y = (X[:, 0] + 0.5 * rng.normal(size=200) > 0).astype(int)
+    model = VotingClassifier(
+        [('lr', 'drop'), ('rf', RandomForestClassifier(n_estimators=5, max_depth=3, random_state=0)),
+         ('lr2', LogisticRegression())],
+        voting='soft', weights=[5.0, 1.0, 3.0],
+    ).fit(X, y)
+    compiled = compile_model(model)
+    assert isinstance(compiled, CompiledModel)
+    assert np.allclose(compiled.predict_proba(X), model.predict_proba(X), rtol=0, atol=1e-9)
+
+
+if __name__ == "__main__":
+    test_forest()
@@ -618,12 +618,18 @@ def test_model():
             print(f"❌ Unexpected Error: {e}")
     
     # Summary
+    print_summary(test_cases, correct_predictions, total_predictions)
+
+def print_summary(cases, correct_predictions, total_predictions):
+    # Also used by run_tests.py
     if total_predictions > 0:
+        wins = sum(1 for case in cases if case.get('expected') == 'win')
+        losses = sum(1 for case in cases if case.get('expected') == 'loss')
         accuracy = (correct_predictions / total_predictions) * 100
         print("\n" + "=" * 60)
         print("TESTING SUMMARY")
         print("=" * 60)
-        print(f"Total Test Cases: {len(test_cases)}")
+        print(f"Total Test Cases: {len(cases)}")
         print(f"Successfully Tested: {total_predictions}")
         print(f"Correct Predictions: {correct_predictions}")
         print(f"Model Accuracy: {accuracy:.1f}%")
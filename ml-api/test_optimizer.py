@@ -0,0 +1,42 @@
+import time
+import warnings
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main_advanced
+
+warnings.filterwarnings("ignore", message="X does not have valid feature names")
+
+# /optimize_bid through the advanced app. Needs model_advanced.arrays from
+# train_model_advanced.py.
+# To run: python -m pytest test_optimizer.py
+
+COSTS = {"materials_cost": 250000, "labor_cost": 180000, "equipment_cost": 60000, "overhead_cost": 40000}
+BID = {**COSTS, "timeline_days": 180, "roi": 18, "contingency": 8}
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(main_advanced.app) as client:
+        deadline = time.monotonic() + 30
+        while client.get("/readyz").status_code != 200:
+            assert time.monotonic() < deadline, "main_advanced did not become ready"
+            time.sleep(0.01)
+        yield client
+
+
+def test_optimize_bid(client):
+    response = client.post("/optimize_bid", json={"features": BID, "margin_range": [1, 60]})
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert 1 <= result["profit_margin"] <= 60
+    assert result["cost"] == sum(COSTS.values())
+    assert result["bid_total"] == pytest.approx(result["cost"] / (1 - result["profit_margin"] / 100))
+    assert 0 <= result["win_probability"] <= 1
+
+
+def test_optimize_bid_rejects_zero_cost(client):
+    response = client.post("/optimize_bid", json={"features": {**BID, **dict.fromkeys(COSTS, 0)}})
+    assert response.status_code == 422
+    assert "error" in response.json()
@@ -0,0 +1,72 @@
+import warnings
+
+import numpy as np
+import pytest
+
+from bundle import ModelBundle
+from optimizer import MarginSearch
+from schema import ADVANCED_SCHEMA, BASE_SCHEMA, SchemaError
+from test_model_advanced import test_cases
+
+warnings.filterwarnings("ignore", message="X does not have valid feature names")
+
+# Range checks of the feature schemas on the paths that build variants of
+# one bid: variant_matrix / grid_matrix, the margin optimizer and sweeps.
+# The model-backed cases need model_advanced.arrays from
+# train_model_advanced.py.
+# To run: python -m pytest test_schema.py
+
+BID = test_cases[0]["features"]
+SCHEMAS = [BASE_SCHEMA, ADVANCED_SCHEMA]
+
+
+@pytest.fixture(scope="module")
+def bundle():
+    return ModelBundle.load("model_advanced.arrays", model_dir=".")
+
+
+@pytest.mark.parametrize("schema", SCHEMAS)
+def test_single_row_range_checks(schema):
+    for field, value, message in [("bid_total", 0, "bid_total: must be greater than 0"),
+                                  ("labor_cost", -1, "labor_cost: must be at least 0")]:
+        with pytest.raises(SchemaError) as e:
+            schema.matrix({**BID, field: value})
+        assert e.value.status_code == 422 and message in e.value.detail
+    assert schema.matrix({**BID, "materials_cost": 0}).shape == (1, schema.n_columns)
+
+
+@pytest.mark.parametrize("schema", SCHEMAS)
+def test_variant_matrix_checks_variants_not_placeholders(schema):
+    # The base row's value of an overridden field is only a placeholder
+    X = schema.variant_matrix({**BID, "bid_total": 0.0}, {"bid_total": np.array([1e5, 2e5])})
+    assert X.shape == (2, schema.n_columns) and np.isfinite(X).all()
+    with pytest.raises(SchemaError, match="bid_total: must be greater than 0"):
+        schema.variant_matrix(BID, {"bid_total": np.array([1e5, 0.0])})
+    # Fields that are not overridden are still checked on the base row
+    with pytest.raises(SchemaError, match="labor_cost: must be at least 0"):
+        schema.variant_matrix({**BID, "labor_cost": -1}, {"bid_total": np.array([1e5])})
+
+
+def test_grid_matrix_checks_every_axis():
+    axes = [("bid_total", np.array([1e5, 2e5])), ("materials_cost", np.array([0.0, 5e4]))]
+    assert ADVANCED_SCHEMA.grid_matrix(BID, axes).shape == (4, ADVANCED_SCHEMA.n_columns)
+    with pytest.raises(SchemaError, match="materials_cost: must be at least 0"):
+        ADVANCED_SCHEMA.grid_matrix(BID, [("materials_cost", np.array([-1.0, 5e4]))])
+
+
+def test_margin_search(bundle):
+    costs = {"materials_cost": 250000, "labor_cost": 180000, "equipment_cost": 60000, "overhead_cost": 40000}
+    search = MarginSearch(bundle, {**costs, "timeline_days": 180, "roi": 18, "contingency": 8})
+    result = search.run(1, 60)
+    assert 1 <= result["profit_margin"] <= 60
+    assert result["bid_total"] > result["cost"] == sum(costs.values())
+    assert search.batches >= 1
+
+
+def test_sweep(bundle):
+    base, surface = bundle.sweep(BID, [("bid_total", np.array([1e5, 5e5, 1e6]))])
+    assert 0 <= base <= 1 and surface.shape == (3,)
+    with pytest.raises(SchemaError, match="bid_total: must be greater than 0"):
+        bundle.sweep(BID, [("bid_total", np.array([0.0, 5e5]))])
+    with pytest.raises(SchemaError, match="bid_total: must be greater than 0"):
+        bundle.sweep({**BID, "bid_total": 0}, [("profit_margin", np.array([5.0, 10.0]))])
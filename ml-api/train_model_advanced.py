@@ -4,11 +4,15 @@ from sklearn.model_selection import train_test_split, cross_val_score, GridSearc
 from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier, VotingClassifier
 from sklearn.linear_model import LogisticRegression
 from sklearn.preprocessing import StandardScaler
+from sklearn.pipeline import make_pipeline
 from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
-import joblib
 import sys
 import os
 
+from bundle import save_arrays, save_bundle
+from compression import compress
+from features import FEATURES, BASE_FEATURES, COUNT_FEATURES, from_frame, prepare_export
+
 # Load data
 csv_path = 'bids.csv'
 if os.path.exists(csv_path):
@@ -18,10 +22,6 @@ else:
     print("bids.csv not found!")
     sys.exit(1)
 
-# Rename columns to match feature engineering expectations
-if 'total_cost' in df.columns:
-    df = df.rename(columns={"total_cost": "bid_total"})
-
 # Create target variable from status
 if 'won' not in df.columns and 'status' in df.columns:
     df['won'] = df['status'].map({'accepted': 1, 'rejected': 0, 'withdrawn': 0})
@@ -29,64 +29,13 @@ if 'won' not in df.columns and 'status' in df.columns:
 # Feature Engineering
 print("Performing feature engineering...")
 
-# 1. Calculate timeline_days
-try:
-    df['timeline_days'] = (
-        pd.to_datetime(df['completion_date']) - pd.to_datetime(df['start_date'])
-    ).dt.days
-except:
-    df['timeline_days'] = 0
-
-# 2. Cost ratios (important features)
-try:
-    df['materials_ratio'] = df['materials_cost'] / df['bid_total']
-    df['labor_ratio'] = df['labor_cost'] / df['bid_total']
-    df['equipment_ratio'] = df['equipment_cost'] / df['bid_total']
-    df['overhead_ratio'] = df['overhead_cost'] / df['bid_total']
-except Exception as e:
-    print(f"Error computing cost ratios: {e}")
-    df['materials_ratio'] = 0
-    df['labor_ratio'] = 0
-    df['equipment_ratio'] = 0
-    df['overhead_ratio'] = 0
-
-# 3. Efficiency metrics
-try:
-    df['cost_per_day'] = df['bid_total'] / df['timeline_days'].replace(0, 1)
-    df['profit_per_day'] = (df['bid_total'] * df['profit_margin'] / 100) / df['timeline_days'].replace(0, 1)
-except Exception as e:
-    print(f"Error computing efficiency metrics: {e}")
-    df['cost_per_day'] = 0
-    df['profit_per_day'] = 0
-
-# 4. Risk indicators
-try:
-    df['high_risk'] = ((df['contingency'] > 15) | (df['timeline_days'] < 0)).astype(int)
-    df['low_margin'] = (df['profit_margin'] < 10).astype(int)
-except Exception as e:
-    print(f"Error computing risk indicators: {e}")
-    df['high_risk'] = 0
-    df['low_margin'] = 0
-
-# 5. Text-based features (if available)
-if 'technical_risks' in df.columns:
-    df['risk_count'] = df['technical_risks'].astype(str).str.count('\\n') + 1
-else:
-    df['risk_count'] = 0
-
-if 'permits' in df.columns:
-    df['permit_count'] = df['permits'].astype(str).str.count('\\n') + 1
-else:
-    df['permit_count'] = 0
+# 1. Renamed columns, timeline_days and text-based counts from the raw
+# export columns (shared with the /predict_stream bulk endpoint)
+df = prepare_export(df)
 
-# Select features
-features = [
-    'bid_total', 'materials_cost', 'labor_cost', 'equipment_cost', 'overhead_cost',
-    'timeline_days', 'profit_margin', 'roi', 'contingency',
-    'materials_ratio', 'labor_ratio', 'equipment_ratio', 'overhead_ratio',
-    'cost_per_day', 'profit_per_day', 'high_risk', 'low_margin',
-    'risk_count', 'permit_count'
-]
+# Select features (ratios, efficiency metrics and risk indicators are
+# derived by features.engineer, shared with main_advanced.py)
+features = FEATURES
 
 # Remove rows where target is null
 df = df.dropna(subset=['won'])
@@ -96,13 +45,13 @@ if df.empty:
     sys.exit(1)
 
 # Check for missing features
-missing_features = [f for f in features if f not in df.columns]
+missing_features = [f for f in BASE_FEATURES + COUNT_FEATURES if f not in df.columns]
 if missing_features:
     print(f"Missing features in data: {missing_features}")
     print(f"Available columns: {df.columns.tolist()}")
     sys.exit(1)
 
-X = df[features].fillna(0)
+X = pd.DataFrame(from_frame(df), columns=features, index=df.index)
 y = df['won']
 
 print(f"Training with {len(X)} samples and {len(features)} features")
@@ -183,7 +132,9 @@ print("\n=== Creating Ensemble Model ===")
 
 rf = RandomForestClassifier(n_estimators=100, random_state=42)
 gb = GradientBoostingClassifier(random_state=42)
-lr = LogisticRegression(random_state=42)
+# The linear model gets its scaling inside the ensemble; the trees use the
+# raw features, so the saved bundle needs no separate scaler
+lr = make_pipeline(StandardScaler(), LogisticRegression(random_state=42))
 
 ensemble = VotingClassifier(
     estimators=[('rf', rf), ('gb', gb), ('lr', lr)],
@@ -215,17 +166,62 @@ for name, model in models_to_test.items():
     print(f"Classification Report:")
     print(classification_report(y_test, y_pred))
 
-# 5. Save the best model
+# 5. Compression (opt-in): with COMPRESSION_TOLERANCE set, refit smaller
+# variants of the ensemble and ship the smallest tree-based one whose
+# cross-validated accuracy is within that tolerance of the full ensemble
+# or, when it scores higher, the tuned single model (0: no accuracy loss).
+# Unset or "off", the full ensemble is shipped. LATENCY_BUDGET_MS is the
+# single-row p99 the chosen model is checked against.
 best_ensemble = ensemble
-joblib.dump(best_ensemble, "model_advanced.pkl")
-joblib.dump(scaler, "scaler.pkl")
+compression_tolerance = os.environ.get('COMPRESSION_TOLERANCE', 'off')
+if compression_tolerance != 'off':
+    print("\n=== Compressing Ensemble ===")
+    best_ensemble, chosen, _ = compress(
+        X_train, y_train, X_test, y_test,
+        tolerance=float(compression_tolerance),
+        budget_ms=float(os.environ.get('LATENCY_BUDGET_MS', 5)),
+        reference=(f"tuned {best_model[0]}", grid_search.best_score_),
+    )
+    print(f"Shipping the compressed variant '{chosen['name']}' instead of the full ensemble "
+          f"(COMPRESSION_TOLERANCE={compression_tolerance})")
+else:
+    print("\nShipping the full ensemble (set COMPRESSION_TOLERANCE to compress it)")
+
+# The manifest describes the estimator actually shipped: only a variant
+# with the logistic regression has a scaler folded into it
+preprocessing = ["features.engineer"]
+if 'lr' in best_ensemble.named_estimators_:
+    preprocessing.append("StandardScaler folded into the logistic regression")
+
+# 6. Save the best model as one bundle: feature order, preprocessing and
+# estimator, checked against the serving path on the test bids
+parity_rows = df.loc[X_test.index, BASE_FEATURES + COUNT_FEATURES].to_dict('records')
+parity_diff = save_bundle(
+    "model_advanced_bundle.pkl",
+    best_ensemble,
+    features,
+    preprocessing=preprocessing,
+    rows=parity_rows,
+    probabilities=best_ensemble.predict_proba(X_test)[:, 1],
+)
 
-print(f"\nAdvanced model saved as 'model_advanced.pkl'")
-print(f"Scaler saved as 'scaler.pkl'")
+print(f"\nAdvanced model saved as 'model_advanced_bundle.pkl'")
+print(f"Train/serve parity on {len(parity_rows)} test bids: max probability difference {parity_diff:.2g}")
+
+# The same model as memory-mappable node arrays, loaded by the servers
+arrays_diff = save_arrays(
+    "model_advanced.arrays",
+    best_ensemble,
+    features,
+    preprocessing=preprocessing,
+    rows=parity_rows,
+    probabilities=best_ensemble.predict_proba(X_test)[:, 1],
+)
+print(f"Advanced model arrays saved to 'model_advanced.arrays' (max probability difference {arrays_diff:.2g})")
 
-# 6. Feature Importance (for Random Forest)
-if hasattr(best_ensemble, 'estimators_'):
-    rf_model = best_ensemble.estimators_[0]  # First estimator is Random Forest
+# 7. Feature Importance (for Random Forest, if the saved model kept it)
+if hasattr(best_ensemble, 'named_estimators_'):
+    rf_model = best_ensemble.named_estimators_.get('rf')
     if hasattr(rf_model, 'feature_importances_'):
         feature_importance = pd.DataFrame({
             'feature': features,